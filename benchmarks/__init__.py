@@ -0,0 +1,16 @@
+"""Performance benchmarks for pyMM.
+
+    python -m benchmarks.suite --out results.jsonl
+    python -m benchmarks.compare baseline.jsonl results.jsonl
+    python -m benchmarks.bench_score
+
+Run the modules from the repository root, so that pyMM is importable
+without installing it.
+
+suite times fit, single E- and M-steps, score_samples and sample for every
+model type over sweeps of the number of examples, dimensionality, number of
+components, latent dimensionality and fraction of missing values, and
+records peak memory. Results are written as JSON lines tagged with the git
+commit, and compare reports the cases that slowed down between two runs.
+bench_score times score_samples against a training E-step.
+"""
@@ -0,0 +1,72 @@
+"""Time score_samples against a training E-step.
+
+score_samples evaluates only the log-densities, so scoring a batch should
+cost a fraction of an EM iteration over the same batch. The batch is
+mixture data from the generator in examples/util.py, as in the benchmark
+suite. For each model, a model is fitted on a subset of it, and then the
+batch is both scored and passed through the training E-step (as
+score_samples used to do).
+
+    python -m benchmarks.bench_score --n-examples 1000000 --missing 0.1
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+from pyMM import GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'examples'))
+from util import _generate_mixture_data  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--n-examples', type=int, default=200000)
+    parser.add_argument('--data-dim', type=int, default=30)
+    parser.add_argument('--n-components', type=int, default=10)
+    parser.add_argument('--latent-dim', type=int, default=5)
+    parser.add_argument('--missing', type=float, default=0.,
+                        help='fraction of missing values')
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    X = _generate_mixture_data(args.data_dim, args.n_components,
+                               args.n_examples)
+    if args.missing > 0:
+        rng = np.random.RandomState(1)
+        X[rng.rand(*X.shape) < args.missing] = np.nan
+    X_fit = X[:min(args.n_examples, 20000)]
+    models = [GMM(args.n_components),
+              SphericalGMM(args.n_components),
+              DiagonalGMM(args.n_components),
+              MPPCA(args.n_components, args.latent_dim),
+              MFA(args.n_components, args.latent_dim)]
+
+    print('{:>14s} {:>12s} {:>12s} {:>8s}'.format('model', 'score (s)',
+                                                  'e-step (s)', 'ratio'))
+    for model in models:
+        model.verbose = False
+        model.robust = True
+        model.max_iter = 5
+        model.fit(X_fit)
+
+        start = time.time()
+        model.score_samples(X)
+        score_time = time.time() - start
+
+        start = time.time()
+        model.missing_data = bool(np.isnan(X).any())
+        model._e_step(X, model.params)
+        e_step_time = time.time() - start
+
+        print('{:>14s} {:12.3f} {:12.3f} {:8.3f}'.format(
+            type(model).__name__, score_time, e_step_time,
+            score_time / e_step_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Compare two benchmark result files.
+
+Cases are matched on the model and configuration. For each timing, the
+ratio of the new time to the baseline time is reported, and cases slower
+than the threshold are flagged. If a file holds several runs of a case,
+the last one is used. The exit status is 1 if any case regressed.
+
+    python -m benchmarks.compare baseline.jsonl results.jsonl
+"""
+
+import argparse
+import json
+import sys
+
+KEYS = ('model', 'n_examples', 'data_dim', 'n_components', 'latent_dim',
+        'missing')
+
+TIMES = ('fit_time', 'e_step_time', 'm_step_time', 'score_time',
+         'sample_time')
+
+
+def _load(filename):
+    results = {}
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[tuple(result[key] for key in KEYS)] = result
+    return results
+
+
+def compare(baseline, results, threshold=1.2):
+    """ Compare result dicts keyed by case.
+
+    Returns a list of (case, timing, ratio) for every timing whose ratio of
+    new to baseline time exceeds threshold.
+    """
+    regressions = []
+    for case in sorted(set(baseline) & set(results), key=str):
+        ratios = []
+        for timing in TIMES:
+            old = baseline[case].get(timing)
+            new = results[case].get(timing)
+            if not old or new is None:
+                continue
+            ratio = new / old
+            ratios.append('{}={:.2f}'.format(timing[:-5], ratio))
+            if ratio > threshold:
+                regressions.append((case, timing, ratio))
+        print(' '.join(str(value) for value in case), ' '.join(ratios))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare benchmark runs.')
+    parser.add_argument('baseline')
+    parser.add_argument('results')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='time ratio above which a case regressed')
+    args = parser.parse_args()
+
+    regressions = compare(_load(args.baseline), _load(args.results),
+                          args.threshold)
+    for case, timing, ratio in regressions:
+        print('REGRESSION', ' '.join(str(value) for value in case), timing,
+              '{:.2f}x'.format(ratio))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
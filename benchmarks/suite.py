@@ -0,0 +1,189 @@
+"""Benchmark suite over model types and problem sizes.
+
+Each case starts from a base configuration and varies one of n_examples,
+data_dim, n_components, latent_dim or missing. Data comes from the
+generators in examples/util.py: mixture data for GMM, SphericalGMM and
+DiagonalGMM, and low-rank data for MPPCA and MFA. Every case writes one
+JSON line holding the configuration and the measurements:
+
+    fit_time : Time of fit with max_iter iterations, including
+               initialisation.
+    e_step_time, m_step_time : Best time of one E-step over all the data
+                               and of one M-step.
+    score_time : Best time of score_samples over all the data.
+    sample_time : Best time of sample for n_examples examples.
+    fit_peak_mb, score_peak_mb : Peak memory allocated during fit and
+                                 score_samples, as traced by tracemalloc.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from pyMM import GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA
+from pyMM.models import _DataChunks
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'examples'))
+from util import _generate_mixture_data, _gen_low_rank_data  # noqa: E402
+
+MODELS = {'GMM': GMM, 'SphericalGMM': SphericalGMM,
+          'DiagonalGMM': DiagonalGMM, 'MPPCA': MPPCA, 'MFA': MFA}
+
+BASE = {'n_examples': 20000, 'data_dim': 20, 'n_components': 5,
+        'latent_dim': 3, 'missing': 0.}
+
+SWEEPS = {'n_examples': [5000, 20000, 80000],
+          'data_dim': [10, 20, 40],
+          'n_components': [2, 5, 10],
+          'latent_dim': [1, 3, 6],
+          'missing': [0., 0.05, 0.2]}
+
+QUICK_BASE = {'n_examples': 2000, 'data_dim': 10, 'n_components': 3,
+              'latent_dim': 2, 'missing': 0.}
+
+QUICK_SWEEPS = {'n_examples': [2000, 8000],
+                'data_dim': [5, 10],
+                'n_components': [3, 6],
+                'latent_dim': [1, 2],
+                'missing': [0., 0.1]}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+            ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _cases(model_names, base, sweeps):
+    """ Generate (model_name, config) pairs without duplicates"""
+    seen = set()
+    for model_name in model_names:
+        latent = model_name in ('MPPCA', 'MFA')
+        for key, values in sweeps.items():
+            if key == 'latent_dim' and not latent:
+                continue
+            for value in values:
+                config = dict(base)
+                config[key] = value
+                if not latent:
+                    config['latent_dim'] = None
+                case = (model_name,) + tuple(sorted(config.items()))
+                if case not in seen:
+                    seen.add(case)
+                    yield model_name, config
+
+
+def _gen_data(model_name, config):
+    np.random.seed(0)
+    if model_name in ('MPPCA', 'MFA'):
+        X = _gen_low_rank_data(config['data_dim'], config['latent_dim'],
+                               config['n_examples'])
+    else:
+        X = _generate_mixture_data(config['data_dim'],
+                                   config['n_components'],
+                                   config['n_examples'])
+    if config['missing'] > 0:
+        rng = np.random.RandomState(1)
+        X[rng.rand(*X.shape) < config['missing']] = np.nan
+    return X
+
+
+def _best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _peak_mb(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(model_name, config, max_iter=5, repeat=3):
+    """ Time one model on one configuration. Returns a result dict"""
+    X = _gen_data(model_name, config)
+    args = (config['n_components'],)
+    if config['latent_dim'] is not None:
+        args += (config['latent_dim'],)
+
+    def make_model():
+        return MODELS[model_name](*args, tol=0, max_iter=max_iter,
+                                  verbose=False, robust=True)
+
+    model = make_model()
+    start = time.perf_counter()
+    model.fit(X)
+    fit_time = time.perf_counter() - start
+    fit_peak_mb = _peak_mb(lambda: make_model().fit(X))
+
+    data = _DataChunks(X, model.working_memory * 2**20, model.dtype)
+    params = model.params
+    ss, _ = model._e_step_chunks(data, params)
+    result = dict(config)
+    result.update({
+        'model': model_name,
+        'fit_time': fit_time,
+        'max_iter': max_iter,
+        'e_step_time': _best_time(lambda: model._e_step_chunks(data, params),
+                                  repeat),
+        'm_step_time': _best_time(lambda: model._m_step(ss, params), repeat),
+        'score_time': _best_time(lambda: model.score_samples(X), repeat),
+        'sample_time': _best_time(lambda: model.sample(X.shape[0]), repeat),
+        'fit_peak_mb': fit_peak_mb,
+        'score_peak_mb': _peak_mb(lambda: model.score_samples(X))
+        })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the pyMM benchmark '
+                                     'suite.')
+    parser.add_argument('--out', default='benchmark_results.jsonl',
+                        help='JSON lines file that results are appended to')
+    parser.add_argument('--models', nargs='+', default=list(MODELS),
+                        choices=list(MODELS))
+    parser.add_argument('--max-iter', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true',
+                        help='small sizes, for checking the suite runs')
+    args = parser.parse_args()
+
+    base, sweeps = (QUICK_BASE, QUICK_SWEEPS) if args.quick else (BASE,
+                                                                  SWEEPS)
+    commit = _git_commit()
+    run_time = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with open(args.out, 'a') as f:
+        for model_name, config in _cases(args.models, base, sweeps):
+            result = run_case(model_name, config, args.max_iter,
+                              args.repeat)
+            result.update({'commit': commit, 'run_time': run_time,
+                           'numpy': np.__version__})
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            print('{model:>12s} N={n_examples:<6d} D={data_dim:<3d} '
+                  'K={n_components:<3d} L={latent_dim!s:<4s} '
+                  'miss={missing:<5.2f} fit {fit_time:7.3f}s '
+                  'e-step {e_step_time:7.4f}s score {score_time:7.4f}s '
+                  'peak {fit_peak_mb:7.1f}MB'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Ellipse
 
 
 def _get_rand_cov_mat(dim):
@@ -18,10 +16,13 @@ def _generate_mixture_data(dim, n_components, n_samples):
     mu_list = [8*np.random.randn(dim) for j in range(n_components)]
     components_cumsum = np.cumsum(components)
     samples = np.zeros([n_samples, dim])
-    for n in range(n_samples):
-        r = np.random.rand(1)
-        z = np.argmin(r > components_cumsum)
-        samples[n] = np.random.multivariate_normal(mu_list[z], Sigma_list[z])
+    z = np.searchsorted(components_cumsum, np.random.rand(n_samples))
+    z = np.minimum(z, n_components - 1)
+    for k in range(n_components):
+        rows = z == k
+        samples[rows] = np.random.multivariate_normal(mu_list[k],
+                                                      Sigma_list[k],
+                                                      size=rows.sum())
     return samples
 
 
@@ -58,6 +59,9 @@ def plot_cov_ellipse(cov, pos, nstd=2, ax=None, **kwargs):
     -------
         A matplotlib ellipse artist
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Ellipse
+
     def eigsorted(cov):
         vals, vecs = np.linalg.eigh(cov)
         order = vals.argsort()[::-1]
@@ -80,6 +84,7 @@ def plot_cov_ellipse(cov, pos, nstd=2, ax=None, **kwargs):
 def plot_density(model, x_range='auto', y_range='auto', n_grid=100,
                  with_scatter=True, X=None, contour_options=None,
                  scatter_options=None, with_missing=False, X_miss=None):
+    import matplotlib.pyplot as plt
 
     # Set default options
     if contour_options is None:
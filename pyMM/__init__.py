@@ -1 +1,4 @@
-from .models import GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA
\ No newline at end of file
+from .models import GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA
+from .selection import select_model
+from .io import save_model, load_model
+from .serving import BatchScorer
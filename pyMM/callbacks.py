@@ -0,0 +1,242 @@
+"""Callbacks for monitoring and controlling EM.
+
+Callbacks passed to fit are called at the start and end of the fit and after
+every EM iteration. Each iteration is described by a dict:
+
+    info['iteration'] : Index of the iteration, counted from 0 for every
+                        EM run (each of the n_init restarts is a run).
+
+    info['log_likelihood'] : Mean log-likelihood per dimension of the
+                             parameters evaluated by the E-step.
+
+    info['change'] : Change in log-likelihood from the previous iteration,
+                     inf for the first iteration.
+
+    info['e_step_time'] : Seconds spent in the E-step.
+
+    info['log_prob_time'] : Seconds of the E-step spent factorizing and
+                            evaluating log-densities and responsibilities.
+                            None when the E-step runs in worker processes,
+                            or when no callback uses it.
+
+    info['ss_time'] : Seconds of the E-step spent on everything else,
+                      mostly the sufficient statistics.
+
+    info['m_step_time'] : Seconds spent in the M-step, or None for the
+                          final iteration, which has no M-step.
+
+    info['allocated_bytes'] : Peak memory traced by tracemalloc during the
+                              iteration, or None if tracemalloc is not
+                              tracing.
+
+    info['components'] : Component proportions evaluated by the E-step.
+
+When no callbacks are given and verbose is False, none of this is measured.
+"""
+
+# License: MIT
+
+import json
+import time
+import tracemalloc
+import numpy as np
+
+
+class Callback(object):
+    """ Base class for fit callbacks. All methods do nothing by default.
+
+    Attributes
+    ----------
+    uses_log_prob_time : bool
+        Whether the callback reads log_prob_time and ss_time. Measuring them
+        wraps the model's log-density methods with timers, so fit only does
+        so when a callback sets this.
+    """
+    uses_log_prob_time = True
+
+    def on_fit_begin(self, model):
+        """ Called at the start of fit"""
+
+    def on_iteration(self, model, info):
+        """ Called after every EM iteration.
+
+        Returns
+        -------
+        stop : bool
+            If True, EM stops after this iteration and keeps the parameters
+            from its M-step.
+        """
+        return False
+
+    def on_fit_end(self, model):
+        """ Called when fit returns or raises"""
+
+
+class ProgressPrinter(Callback):
+    """ Print the log-likelihood of every iteration.
+
+    Used by fit when the model is verbose. Output is not flushed after
+    every line.
+    """
+    uses_log_prob_time = False
+
+    def on_iteration(self, model, info):
+        print("Iter {:d}   NLL: {:.4f}   Change: {:.4f}".format(
+            info['iteration'], -info['log_likelihood'], -info['change']))
+        return False
+
+
+class JsonTrace(Callback):
+    """ Write the info of every iteration to a JSON-lines file.
+
+    Parameters
+    ----------
+    filename : str
+        File that the trace is appended to, one JSON object per iteration,
+        with the model class and a wall-clock timestamp added.
+
+    trace_memory : bool
+        Whether to start tracemalloc for the duration of the fit, so that
+        allocated_bytes is recorded. Tracing slows down allocation-heavy
+        code.
+    """
+
+    def __init__(self, filename, trace_memory=False):
+        self.filename = filename
+        self.trace_memory = trace_memory
+        self._file = None
+        self._started_tracing = False
+
+    def on_fit_begin(self, model):
+        self._file = open(self.filename, 'a')
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def on_iteration(self, model, info):
+        record = dict(info)
+        record['components'] = np.asarray(info['components']).tolist()
+        if not np.isfinite(record['change']):
+            record['change'] = None
+        record['model'] = type(model).__name__
+        record['time'] = time.time()
+        self._file.write(json.dumps(record) + '\n')
+        return False
+
+    def on_fit_end(self, model):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class EarlyStopping(Callback):
+    """ Stop EM on slow progress or after a time budget.
+
+    Parameters
+    ----------
+    min_change : float
+        EM stops once the log-likelihood has improved by less than
+        min_change for patience consecutive iterations.
+
+    patience : int
+        Number of consecutive iterations of slow progress before stopping.
+
+    max_time : float, optional
+        EM stops once a run has taken more than max_time seconds.
+    """
+    uses_log_prob_time = False
+
+    def __init__(self, min_change=0., patience=1, max_time=None):
+        self.min_change = min_change
+        self.patience = patience
+        self.max_time = max_time
+
+    def on_iteration(self, model, info):
+        if info['iteration'] == 0:
+            self._n_slow = 0
+            self._start = time.perf_counter() - info['e_step_time']
+        if info['change'] < self.min_change:
+            self._n_slow += 1
+        else:
+            self._n_slow = 0
+        if self._n_slow >= self.patience:
+            return True
+        return (self.max_time is not None and
+                time.perf_counter() - self._start > self.max_time)
+
+
+class _Monitor(object):
+    """ Measure EM iterations and pass them to callbacks.
+
+    With profile True, the model's log-density methods are wrapped for the
+    duration of the run to time them. Nested calls are counted once.
+    """
+    _LOG_PROB_METHODS = ('_get_factors', '_get_log_prob',
+                         '_get_log_responsibilities',
+                         '_get_log_responsibilities_miss',
+                         '_get_log_prob_pairs', '_get_spherical_log_prob',
+                         '_get_masked_log_prob')
+
+    def __init__(self, model, callbacks, profile=True):
+        self.model = model
+        self.callbacks = callbacks
+        self.log_prob_time = None
+        self._depth = 0
+        self._wrapped = []
+        if profile:
+            for name in self._LOG_PROB_METHODS:
+                if hasattr(model, name):
+                    setattr(model, name, self._wrap(getattr(model, name)))
+                    self._wrapped.append(name)
+
+    def _wrap(self, method):
+        def timed(*args, **kwargs):
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.log_prob_time += time.perf_counter() - start
+        return timed
+
+    def begin_iteration(self):
+        if self._wrapped:
+            self.log_prob_time = 0.
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+
+    def end_e_step(self):
+        self._e_step_end = time.perf_counter()
+
+    def end_iteration(self, iteration, ll, change, components,
+                      m_step=True):
+        """ Call the callbacks. Returns True if any asks to stop"""
+        e_step_time = self._e_step_end - self._start
+        info = {'iteration': iteration,
+                'log_likelihood': float(ll),
+                'change': float(change),
+                'e_step_time': e_step_time,
+                'log_prob_time': self.log_prob_time,
+                'ss_time': None if self.log_prob_time is None else
+                e_step_time - self.log_prob_time,
+                'm_step_time': time.perf_counter() - self._e_step_end if
+                m_step else None,
+                'allocated_bytes': tracemalloc.get_traced_memory()[1] if
+                tracemalloc.is_tracing() else None,
+                'components': components}
+        stop = False
+        for callback in self.callbacks:
+            stop = callback.on_iteration(self.model, info) or stop
+        return stop
+
+    def close(self):
+        """ Remove the wrappers from the model"""
+        for name in self._wrapped:
+            delattr(self.model, name)
+        self._wrapped = []
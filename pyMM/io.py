@@ -0,0 +1,134 @@
+"""Saving and loading fitted mixture models.
+
+A model is saved as a directory holding one .npy file for each stacked
+parameter array, for each of the precomputed factors used for scoring and
+for each running statistic of partial_fit, together with a JSON header
+recording the format version, the model class, its constructor arguments
+and the fitted attributes. Loading memory-maps the arrays, so models are
+opened without copying their parameters, and worker processes that load the
+same model share its pages through the OS page cache.
+"""
+
+# License: MIT
+
+import inspect
+import json
+import numbers
+import os
+import numpy as np
+
+from .models import GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA
+
+# Version 2 added the running statistics of partial_fit. Models saved in
+# version 1 load, but partial_fit can not continue them.
+FORMAT_VERSION = 2
+
+_HEADER = 'header.json'
+
+_MODEL_CLASSES = {model_class.__name__: model_class for model_class in
+                  (GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA)}
+
+
+def _init_args(model):
+    """ Constructor arguments of model, read from its attributes"""
+    signature = inspect.signature(type(model).__init__)
+    args = {}
+    for name in list(signature.parameters)[1:]:
+        value = getattr(model, name)
+        if name == 'dtype':
+            value = value.str
+        elif name == 'random_state':
+            # RandomState instances are not saved
+            if isinstance(value, numbers.Integral):
+                value = int(value)
+            else:
+                value = None
+        args[name] = value
+    return args
+
+
+def save_model(model, path):
+    """ Save a fitted model to the directory path.
+
+    Parameters
+    ----------
+    model : BaseModel
+        Fitted GMM, SphericalGMM, DiagonalGMM, MPPCA or MFA. The running
+        statistics of partial_fit are saved with the parameters, so a loaded
+        model resumes partial_fit where it left off.
+
+    path : str
+        Directory to write to. It is created if it does not exist, and
+        existing files of a saved model are overwritten.
+    """
+    if not model.isFitted:
+        raise ValueError('Model is not yet fitted')
+    if type(model).__name__ not in _MODEL_CLASSES:
+        raise ValueError('Cannot save models of class ' +
+                         type(model).__name__)
+    os.makedirs(path, exist_ok=True)
+    arrays = {'params': model.params,
+              'factors': model._get_fitted_factors(),
+              'ss': model._ss or {}}
+    for group, values in arrays.items():
+        for key, value in values.items():
+            np.save(os.path.join(path, group + '.' + key + '.npy'), value)
+
+    # The header is written last, so a directory with a header is complete
+    header = {'format_version': FORMAT_VERSION,
+              'class': type(model).__name__,
+              'init': _init_args(model),
+              'attributes': {'data_dim': int(model.data_dim),
+                             'n_examples': np.asarray(model.n_examples).item(),
+                             'missing_data': bool(model.missing_data),
+                             'trainNll': float(model.trainNll),
+                             '_n_steps': None if model._n_steps is None else
+                             np.asarray(model._n_steps).item()},
+              'params': sorted(model.params),
+              'factors': sorted(arrays['factors']),
+              'ss': sorted(arrays['ss'])}
+    with open(os.path.join(path, _HEADER), 'w') as f:
+        json.dump(header, f, indent=2)
+
+
+def load_model(path, mmap_mode='r'):
+    """ Load a model saved with save_model.
+
+    Parameters
+    ----------
+    path : str
+        Directory written by save_model.
+
+    mmap_mode : {None, 'r', 'r+', 'c'}
+        Memory-map mode for the arrays, as for np.load. The default 'r'
+        maps them read-only; None reads them into memory.
+
+    Returns
+    -------
+    model : BaseModel
+        The fitted model. Its saved factors are used for scoring, so they
+        are not recomputed.
+    """
+    with open(os.path.join(path, _HEADER)) as f:
+        header = json.load(f)
+    if header['format_version'] > FORMAT_VERSION:
+        raise ValueError('Model was saved in format version {:d}, but this '
+                         'version of pyMM reads up to version {:d}'.format(
+                             header['format_version'], FORMAT_VERSION))
+    if header['class'] not in _MODEL_CLASSES:
+        raise ValueError('Unknown model class ' + header['class'])
+
+    model = _MODEL_CLASSES[header['class']](**header['init'])
+    for name, value in header['attributes'].items():
+        setattr(model, name, value)
+    arrays = {}
+    for group in ('params', 'factors', 'ss'):
+        arrays[group] = {key: np.load(os.path.join(path, group + '.' + key +
+                                                   '.npy'),
+                                      mmap_mode=mmap_mode)
+                         for key in header.get(group, [])}
+    model.params = arrays['params']
+    model._ss = arrays['ss'] or None
+    model._factors_cache = (model.params, arrays['factors'])
+    model.isFitted = True
+    return model
@@ -12,15 +12,635 @@ data that is missing at random (MAR).
 # Authors: Charlie Nash <charlie.nash@ed.ac.uk>
 # License: MIT
 
+import copy
+import mmap
+import multiprocessing
+import os
 import numpy as np
-import scipy as sp
 import numpy.random as rd
 
-from random import seed
-from scipy.stats import multivariate_normal
+from multiprocessing import shared_memory
+from scipy.linalg import solve_triangular
+from scipy.special import logsumexp
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA, FactorAnalysis
-from sklearn.preprocessing import Imputer
+from sklearn.impute import SimpleImputer
+from sklearn.utils import check_random_state
+
+from .callbacks import ProgressPrinter, _Monitor
+
+# A Python float, so that it does not promote float32 arrays to float64
+_LOG_2PI = float(np.log(2*np.pi))
+
+
+def _stack_params(params):
+    """ Stack list-valued parameters into contiguous arrays.
+
+    Parameters are stored with the mixture components along the first axis,
+    e.g. params['mu_list'] has shape [n_components, data_dim] and
+    params['Sigma_list'] has shape [n_components, data_dim, data_dim].
+    """
+    return {key: np.asarray(value, dtype=float) for key, value in
+            params.items()}
+
+
+def _to_unconstrained(params):
+    """ Map parameters to an unconstrained space.
+
+    Variances and component proportions are log-transformed, and covariance
+    matrices are replaced by their Cholesky factors with log-transformed
+    diagonals, so that any point of the space maps back to valid
+    parameters. Raises LinAlgError if a covariance matrix is not positive
+    definite.
+    """
+    theta = {}
+    for key, value in params.items():
+        if key in ('components', 'sigma_sq_list', 'Psi_list'):
+            with np.errstate(divide='ignore'):
+                theta[key] = np.log(value)
+        elif key == 'Sigma_list':
+            chol_list = np.linalg.cholesky(value)
+            diag = np.arange(value.shape[1])
+            chol_list[:, diag, diag] = np.log(chol_list[:, diag, diag])
+            theta[key] = chol_list
+        else:
+            theta[key] = value
+    return theta
+
+
+def _from_unconstrained(theta):
+    """ Inverse of _to_unconstrained"""
+    params = {}
+    for key, value in theta.items():
+        if key == 'components':
+            components = np.exp(value - value.max())
+            params[key] = components / components.sum()
+        elif key in ('sigma_sq_list', 'Psi_list'):
+            params[key] = np.exp(value)
+        elif key == 'Sigma_list':
+            chol_list = value.copy()
+            diag = np.arange(value.shape[1])
+            chol_list[:, diag, diag] = np.exp(chol_list[:, diag, diag])
+            params[key] = chol_list @ chol_list.transpose(0, 2, 1)
+        else:
+            params[key] = value
+    return params
+
+
+def _squarem_extrapolate(params_list, step_max):
+    """ SQUAREM extrapolation from three successive EM iterates.
+
+    With r = theta_1 - theta_0 and v = theta_2 - 2 theta_1 + theta_0 in the
+    unconstrained space, the new point is
+    theta_0 - 2 alpha r + alpha^2 v, with the step length
+    alpha = -|r| / |v| clipped to [-step_max, -1]. alpha = -1 gives
+    theta_2.
+
+    Returns
+    -------
+    params : dict
+        Extrapolated parameters, or None if the iterates can not be
+        extrapolated.
+
+    alpha : float
+        Step length used.
+    """
+    try:
+        theta_0, theta_1, theta_2 = [_to_unconstrained(params) for params in
+                                     params_list]
+    except np.linalg.LinAlgError:
+        return None, -1.
+    r = {key: theta_1[key] - theta_0[key] for key in theta_0}
+    v = {key: theta_2[key] - theta_1[key] - r[key] for key in theta_0}
+    r_sq = sum(np.sum(value**2) for value in r.values())
+    v_sq = sum(np.sum(value**2) for value in v.values())
+    if not (np.isfinite(r_sq) and np.isfinite(v_sq)) or v_sq == 0:
+        return None, -1.
+    alpha = min(max(-np.sqrt(r_sq / v_sq), -step_max), -1.)
+    theta = {key: theta_0[key] - 2*alpha*r[key] + alpha**2*v[key] for key in
+             theta_0}
+    return _from_unconstrained(theta), alpha
+
+
+def _add_ss(ss, ss_new):
+    """ Add two dictionaries of sufficient statistics"""
+    return {key: ss[key] + ss_new[key] for key in ss}
+
+
+def _ss_to_float(ss):
+    """ Copy sufficient statistics to float64 arrays for accumulation"""
+    return {key: np.array(value, dtype=float) for key, value in ss.items()}
+
+
+def _group_by_component(comps, n_components):
+    """ Group the entries of an integer array of components.
+
+    Entries equal to -1 are skipped. Yields (k, ids) for every component k
+    that occurs, where ids are the flat indices of its entries in comps.
+    """
+    flat = comps.ravel()
+    ids = np.flatnonzero(flat >= 0)
+    ids = ids[np.argsort(flat[ids], kind='stable')]
+    bounds = np.searchsorted(flat[ids], np.arange(n_components + 1))
+    for k in np.flatnonzero(np.diff(bounds)):
+        yield k, ids[bounds[k]:bounds[k + 1]]
+
+
+def _component_slice(arrays, k):
+    """ Restrict a dictionary of per-component arrays to component k"""
+    return {key: value[k:k + 1] for key, value in arrays.items()}
+
+
+def _weight_rows(r, sample_weight, rows=slice(None)):
+    """ Scale the responsibilities r of examples rows by their weights"""
+    if sample_weight is None:
+        return r
+    return r * sample_weight[rows, np.newaxis]
+
+
+def _box_distances(lo, hi, mu_list):
+    """ Distances from points to boxes along each dimension.
+
+    Returns the distances from each of the points mu_list to the nearest
+    and to the farthest point of each box lo <= x <= hi, both with shape
+    [n_boxes, n_points, dim].
+    """
+    below = lo[:, np.newaxis, :] - mu_list
+    above = mu_list - hi[:, np.newaxis, :]
+    return np.maximum(np.maximum(below, above), 0), np.maximum(-below, -above)
+
+
+class _DataChunks(object):
+    """ Training data read in chunks of examples.
+
+    Wraps an in-memory array, a memory-mapped array, the path to a .npy file
+    or a re-iterable collection of arrays (e.g. a list of memory-mapped
+    arrays). Arrays are split into chunks of at most chunk_bytes, so an
+    in-memory array and a memory-mapped copy of it are read in the same
+    chunks. A first pass over the data finds the number of examples, whether
+    any values are missing and which examples are entirely missing. Those
+    examples are skipped when iterating, as are examples of zero weight
+    when sample_weight is given. In truncated EM, candidates holds the
+    candidate components of the examples of each chunk between passes, and
+    in tree-accelerated EM, tree holds the kd-tree of the examples.
+    """
+    def __init__(self, X, chunk_bytes, dtype=np.float64, sample_weight=None):
+        if isinstance(X, str):
+            X = np.load(X, mmap_mode='r')
+        self.dtype = np.dtype(dtype)
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=np.float64)
+            if sample_weight.ndim != 1:
+                raise ValueError('sample_weight must be one-dimensional')
+            if not np.all(np.isfinite(sample_weight) & (sample_weight >= 0)):
+                raise ValueError('sample_weight must be finite and ' +
+                                 'non-negative')
+        if isinstance(X, np.ndarray):
+            n_rows = X.shape[0]
+            row_bytes = (self.dtype.itemsize *
+                         max(int(np.prod(X.shape[1:])), 1))
+            chunk_size = max(int(chunk_bytes // row_bytes), 1)
+            self._slices = [slice(start, min(start + chunk_size, n_rows))
+                            for start in range(0, n_rows, chunk_size)]
+        elif iter(X) is X:
+            raise ValueError('Chunked data must be re-iterable, e.g. a list ' +
+                             'of arrays, as it is read once per EM iteration')
+        else:
+            self._slices = None
+        self._X = X
+        self.in_memory = (isinstance(X, np.ndarray) and
+                          not isinstance(X, np.memmap))
+
+        self.n_examples = 0
+        self.total_weight = 0.
+        self.weights = None if sample_weight is None else []
+        self.data_dim = None
+        self.missing_data = False
+        self.candidates = None
+        self.tree = None
+        self._keep = []
+        n_rows = 0
+        for chunk in self._iter_raw():
+            if chunk.ndim != 2:
+                raise ValueError('Training data must be two-dimensional')
+            if self.data_dim is None:
+                self.data_dim = chunk.shape[1]
+            elif chunk.shape[1] != self.data_dim:
+                raise ValueError('All chunks must have the same number of ' +
+                                 'features')
+            missing = np.isnan(chunk)
+            keep = None
+            if missing.any():
+                self.missing_data = True
+                keep = ~missing.all(axis=1)
+            if sample_weight is not None:
+                weights = sample_weight[n_rows:n_rows + chunk.shape[0]]
+                if weights.shape[0] != chunk.shape[0]:
+                    raise ValueError('sample_weight must have one weight ' +
+                                     'per example')
+                keep = weights > 0 if keep is None else keep & (weights > 0)
+            if keep is not None:
+                keep = None if keep.all() else np.flatnonzero(keep)
+            n_rows += chunk.shape[0]
+            self._keep.append(keep)
+            self.n_examples += chunk.shape[0] if keep is None else keep.size
+            if sample_weight is not None:
+                weights = weights if keep is None else weights[keep]
+                self.weights.append(weights)
+                self.total_weight += weights.sum()
+        if sample_weight is None:
+            self.total_weight = self.n_examples
+        elif n_rows != sample_weight.shape[0]:
+            raise ValueError('sample_weight must have one weight per example')
+
+    def _iter_raw(self):
+        if self._slices is None:
+            for chunk in self._X:
+                yield np.asarray(chunk, dtype=self.dtype)
+        else:
+            for batch in self._slices:
+                yield np.asarray(self._X[batch], dtype=self.dtype)
+
+    def __iter__(self):
+        for chunk, keep in zip(self._iter_raw(), self._keep):
+            yield chunk if keep is None else chunk[keep]
+
+    def iter_weighted(self):
+        """ Iterate over chunks and their weights, None if unweighted"""
+        if self.weights is None:
+            for chunk in self:
+                yield chunk, None
+        else:
+            for chunk, weights in zip(self, self.weights):
+                yield chunk, weights
+
+    def get_weights(self):
+        """ Get the weights of all examples as an array, None if unweighted"""
+        if self.weights is None:
+            return None
+        return np.concatenate(self.weights)
+
+    def subsample(self, n_samples=None):
+        """ Get at most n_samples evenly spaced examples as an array"""
+        if n_samples is None or n_samples >= self.n_examples:
+            if self.in_memory and all(keep is None for keep in self._keep):
+                return np.asarray(self._X, dtype=self.dtype)
+            return np.concatenate(list(self))
+        positions = (np.arange(n_samples) * self.n_examples) // n_samples
+        X_sub = []
+        offset = 0
+        for chunk in self:
+            stop = offset + chunk.shape[0]
+            id_chunk = positions[(positions >= offset) & (positions < stop)]
+            X_sub.append(chunk[id_chunk - offset])
+            offset = stop
+        return np.concatenate(X_sub)
+
+
+# State of a worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(model, source, best_ll=None, sample_weight=None):
+    """ Attach a worker process to the shared training data"""
+    try:
+        from threadpoolctl import threadpool_limits
+        _worker['limits'] = threadpool_limits(1)
+    except ImportError:
+        pass
+    if source[0] == 'shm':
+        _, name, shape, dtype = source
+        _worker['shm'] = shared_memory.SharedMemory(name=name)
+        _worker['X'] = np.ndarray(shape, dtype=dtype,
+                                  buffer=_worker['shm'].buf)
+    else:
+        _, filename, dtype, shape, offset, order = source
+        _worker['X'] = np.memmap(filename, dtype=dtype, mode='r',
+                                 offset=offset, shape=shape, order=order)
+    _worker['model'] = model
+    _worker['best_ll'] = best_ll
+    _worker['sample_weight'] = sample_weight
+    _worker['shards'] = {}
+
+
+def _e_step_worker(task):
+    """ Run the E-step on one shard of the shared training data"""
+    start, stop, params, n_candidates, tree_tol = task
+    model = _worker['model']
+    shards = _worker['shards']
+    if (start, stop) not in shards:
+        sample_weight = _worker['sample_weight']
+        if sample_weight is not None:
+            sample_weight = sample_weight[start:stop]
+        shards[start, stop] = _DataChunks(_worker['X'][start:stop],
+                                          model.working_memory * 2**20,
+                                          model.dtype, sample_weight)
+    return model._e_step_chunks(shards[start, stop], params, n_candidates,
+                                tree_tol)
+
+
+def _restart_worker(task):
+    """ Run one initialisation and EM run on the shared training data"""
+    model = _worker['model']
+    if 'data' not in _worker:
+        _worker['data'] = _DataChunks(_worker['X'],
+                                      model.working_memory * 2**20,
+                                      model.dtype, _worker['sample_weight'])
+    return model._fit_restart(_worker['data'], *task,
+                              best_ll=_worker['best_ll'])
+
+
+def _update_best_ll(best_ll, i, ll, fill=False):
+    """ Record the log-likelihood ll of a run at iteration i.
+
+    best_ll is a shared array holding the best log-likelihood reached at
+    each iteration by any run. If fill is True, ll is also recorded for all
+    later iterations, e.g. when the run has converged. Returns the best
+    log-likelihood at iteration i.
+    """
+    with best_ll.get_lock():
+        stop = len(best_ll) if fill else i + 1
+        for j in range(i, stop):
+            best_ll[j] = max(best_ll[j], ll)
+        return best_ll[i]
+
+
+class _SharedData(object):
+    """ Training data shared with worker processes without pickling.
+
+    In-memory arrays are copied once into shared memory, and memory-mapped
+    arrays are reopened by each worker from their file. source describes
+    the data for _init_worker. In-memory arrays are stored with the given
+    dtype.
+    """
+    def __init__(self, X, dtype=np.float64):
+        if isinstance(X, str):
+            X = np.load(X, mmap_mode='r')
+        self._shm = None
+        if isinstance(X, np.memmap):
+            if not isinstance(X.base, mmap.mmap):
+                raise ValueError('Worker processes require a whole ' +
+                                 'memory-mapped array, not a view of one')
+            order = 'C' if X.flags.c_contiguous else 'F'
+            self.source = ('memmap', X.filename, X.dtype.str, X.shape,
+                           X.offset, order)
+        elif isinstance(X, np.ndarray):
+            dtype = np.dtype(dtype)
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=max(X.shape[0]*X.shape[1]*dtype.itemsize, 1)
+                )
+            X_shared = np.ndarray(X.shape, dtype=dtype, buffer=self._shm.buf)
+            X_shared[:] = X
+            self.source = ('shm', self._shm.name, X.shape, dtype.str)
+        else:
+            raise ValueError('Worker processes require an array, a ' +
+                             'memory-mapped array or the path to a .npy ' +
+                             'file')
+        self.n_rows = X.shape[0]
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+
+
+class _EStepPool(object):
+    """ Pool of processes running the E-step on row shards of X.
+
+    Each worker accumulates the sufficient statistics of its shard of the
+    shared data, and the parent adds them up. With n_candidates, workers
+    run truncated E-steps and keep the candidates of their shard, and with
+    tree_tol they keep a kd-tree of their shard. sample_weight is copied to
+    each worker once.
+    """
+    def __init__(self, model, X, n_jobs, n_candidates=None, tree_tol=None,
+                 sample_weight=None):
+        self._data = _SharedData(X, model.dtype)
+        self._n_candidates = n_candidates
+        self._tree_tol = tree_tol
+        try:
+            n_jobs = min(n_jobs, max(self._data.n_rows, 1))
+            bounds = np.linspace(0, self._data.n_rows,
+                                 n_jobs + 1).astype(int)
+            self._shards = list(zip(bounds[:-1], bounds[1:]))
+            self._pool = multiprocessing.Pool(
+                n_jobs, initializer=_init_worker,
+                initargs=(model, self._data.source, None, sample_weight)
+                )
+        except Exception:
+            self._data.close()
+            raise
+
+    def e_step(self, params):
+        """ E-step over all shards. Returns summed statistics and ll"""
+        results = self._pool.map(_e_step_worker,
+                                 [(start, stop, params, self._n_candidates,
+                                   self._tree_tol)
+                                  for start, stop in self._shards])
+        ss = None
+        ll_sum = 0.
+        for ss_shard, ll_shard in results:
+            if ss_shard is not None:
+                ss = ss_shard if ss is None else _add_ss(ss, ss_shard)
+            ll_sum += ll_shard
+        return ss, ll_sum
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+        self._data.close()
+
+
+class _KDTree(object):
+    """ Balanced kd-tree over the examples of X with cached moments.
+
+    The examples are reordered in X so that every node holds a contiguous
+    range of rows: node j at level l holds rows bounds[l][j] to
+    bounds[l][j + 1], and its children are nodes 2j and 2j + 1 at level
+    l + 1. Nodes are split at their median along their widest dimension,
+    down to leaves of at most leaf_size examples at level depth.
+
+    For every node, lo and hi hold its bounding box, count its number of
+    examples and mean their mean. With sample_weight, count is the total
+    weight of the examples and mean and offsets are weighted, and weights
+    holds the weights in the order of the rows of X, otherwise None.
+    offsets holds [2 * dataDim, dataDim]
+    offsets from the mean, such that the points mean + offsets, each with
+    weight count / (2 * dataDim), have the same first and second moments
+    as the examples of the node. Any statistic linear in x and x x^T,
+    e.g. a Gaussian log-density, sums over those points to its sum over the
+    examples.
+    """
+    def __init__(self, X, sample_weight=None, leaf_size=32,
+                 chunk_bytes=2**27):
+        n_examples, data_dim = X.shape
+        depth = 0
+        while n_examples > leaf_size * 2**depth:
+            depth += 1
+        self.depth = depth
+        self.bounds = [(np.arange(2**level + 1) * n_examples) // 2**level
+                       for level in range(depth + 1)]
+
+        # Split the nodes of each level at their median
+        self.lo, self.hi = [], []
+        for level, bounds in enumerate(self.bounds):
+            self.lo.append(np.minimum.reduceat(X, bounds[:-1]))
+            self.hi.append(np.maximum.reduceat(X, bounds[:-1]))
+            if level == depth:
+                break
+            dim = np.argmax(self.hi[level] - self.lo[level], axis=1)
+            node = np.repeat(np.arange(2**level), np.diff(bounds))
+            order = np.lexsort((X[np.arange(n_examples), dim[node]], node))
+            X = X[order]
+            if sample_weight is not None:
+                sample_weight = sample_weight[order]
+        self.X = X
+        self.weights = sample_weight
+
+        # Moments of the leaves, then of their ancestors
+        bounds = self.bounds[depth]
+        if sample_weight is None:
+            count = np.diff(bounds).astype(float)
+            sums = np.add.reduceat(X, bounds[:-1], dtype=float)
+        else:
+            count = np.add.reduceat(sample_weight, bounds[:-1])
+            sums = np.add.reduceat(sample_weight[:, np.newaxis] * X,
+                                   bounds[:-1])
+        sq_sums = np.empty([bounds.size - 1, data_dim, data_dim])
+        n_leaves = max(int(chunk_bytes // (8 * data_dim**2 * leaf_size)), 1)
+        for first in range(0, bounds.size - 1, n_leaves):
+            last = min(first + n_leaves, bounds.size - 1)
+            X_chunk = np.asarray(X[bounds[first]:bounds[last]], dtype=float)
+            X_weighted = X_chunk
+            if sample_weight is not None:
+                X_weighted = (sample_weight[bounds[first]:bounds[last],
+                                            np.newaxis] * X_chunk)
+            sq_sums[first:last] = np.add.reduceat(
+                X_weighted[:, :, np.newaxis] * X_chunk[:, np.newaxis, :],
+                bounds[first:last] - bounds[first]
+                )
+        self.count, self.mean, self.offsets = [], [], []
+        for level in range(depth, -1, -1):
+            if level < depth:
+                count = count[0::2] + count[1::2]
+                sums = sums[0::2] + sums[1::2]
+                sq_sums = sq_sums[0::2] + sq_sums[1::2]
+            mean = sums / count[:, np.newaxis]
+            cov = (sq_sums / count[:, np.newaxis, np.newaxis] -
+                   mean[:, :, np.newaxis] * mean[:, np.newaxis, :])
+            eig, vec = np.linalg.eigh(cov)
+            scaled = (np.sqrt(data_dim * np.maximum(eig, 0))[:, :, np.newaxis]
+                      * vec.transpose(0, 2, 1))
+            self.count.insert(0, count)
+            self.mean.insert(0, mean)
+            self.offsets.insert(0, np.concatenate([scaled, -scaled], axis=1))
+
+
+class Scorer(object):
+    """ Immutable scorer for a fitted model.
+
+    Holds read-only views of the factors of the fitted parameters, so
+    scoring involves no factorization and no sufficient statistics. Factors
+    of a model loaded with memory-mapping stay mapped, so processes scoring
+    the same model share its pages. The factors are not modified in place
+    by fit, so the scorer is unaffected by later calls to fit on the
+    model. Created by
+    BaseModel.compile.
+
+    Examples with missing values (NaN) are scored under the marginal
+    distribution of their observed dimensions. The marginal factors are
+    computed the first time each pattern of missing values is seen.
+    """
+    def __init__(self, model):
+        if not model.isFitted:
+            raise ValueError('Model is not yet fitted')
+        self._model = copy.copy(model)
+        self.n_components = model.n_components
+        self.data_dim = model.data_dim
+        self.dtype = model.dtype
+        self._factors = {}
+        for key, value in model._get_fitted_factors().items():
+            value = np.asarray(value, dtype=self.dtype).view()
+            value.setflags(write=False)
+            self._factors[key] = value
+        self._marginal_factors = {}
+
+    def _check_X(self, X):
+        X = np.asarray(X, dtype=self.dtype)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.ndim != 2 or X.shape[1] != self.data_dim:
+            raise ValueError('Expected examples with {:d} features'.format(
+                self.data_dim))
+        return X
+
+    def _log_prob(self, X):
+        """ Get log p(x, k) for every example and mixture component"""
+        model = self._model
+        if not np.isnan(X).any():
+            return model._get_log_prob(X, self._factors)
+        log_prob = np.empty([X.shape[0], self.n_components],
+                            dtype=self.dtype)
+        for id_obs, id_miss, rows in model._get_missing_patterns(X):
+            if id_obs.size == 0:
+                log_prob[rows] = self._factors['log_components']
+                continue
+            if id_miss.size == 0:
+                factors = self._factors
+            else:
+                key = id_obs.tobytes()
+                factors = self._marginal_factors.get(key)
+                if factors is None:
+                    factors = model._get_factors(
+                        model._marginal_params(model.params, id_obs)
+                        )
+                    self._marginal_factors[key] = factors
+            log_prob[rows] = model._get_log_prob(X[np.ix_(rows, id_obs)],
+                                                 factors)
+        return log_prob
+
+    @staticmethod
+    def _log_sum(log_prob):
+        """ logsumexp over components"""
+        log_max = log_prob.max(axis=1)
+        return log_max + np.log(np.exp(log_prob -
+                                       log_max[:, np.newaxis]).sum(axis=1))
+
+    def score_samples(self, X):
+        """ Log-likelihood of each example, divided by the number of
+        features as in BaseModel.score_samples.
+
+        Parameters
+        ----------
+        X : array, [nExamples, nFeatures] or [nFeatures]
+            Examples to score, which may contain missing values.
+
+        Returns
+        -------
+        sample_ll : array, [nExamples]
+        """
+        X = self._check_X(X)
+        return self._log_sum(self._log_prob(X)) / self.data_dim
+
+    def score(self, X, sample_weight=None):
+        """ Mean of score_samples over the examples in X, weighted by
+        sample_weight if given.
+        """
+        return np.average(self.score_samples(X), weights=sample_weight)
+
+    def predict_proba(self, X):
+        """ Posterior probabilities of the components.
+
+        Returns
+        -------
+        responsibilities : array, [nExamples, n_components]
+        """
+        log_prob = self._log_prob(self._check_X(X))
+        return np.exp(log_prob - self._log_sum(log_prob)[:, np.newaxis])
+
+    def predict(self, X):
+        """ Most probable component of each example"""
+        return np.argmax(self._log_prob(self._check_X(X)), axis=1)
 
 
 class BaseModel(object):
@@ -30,7 +650,8 @@ class BaseModel(object):
     provides basic common methods for mixture models.
     """
     def __init__(self, n_components, tol=1e-3, max_iter=1000, random_state=0,
-                 verbose=True, robust=False, SMALL=1e-5):
+                 verbose=True, robust=False, SMALL=1e-5, working_memory=128,
+                 dtype=np.float64):
         self.n_components = n_components
         self.tol = tol
         self.max_iter = max_iter
@@ -39,84 +660,629 @@ class BaseModel(object):
         self.robust = robust
         self.isFitted = False
         self.SMALL = SMALL
+        self.working_memory = working_memory
+        self.dtype = np.dtype(dtype)
+        self._ss = None
+        self._n_steps = 0
         self.error_msg = (
             'Covariance matrix ill-conditioned. Use robust=True to ' +
             'pre-condition covariance matrices, increase SMALL or choose ' +
             'fewer mixture components'
             )
 
-    def _get_log_responsibilities(self, X, mu_list, Sigma_list, components):
+    def _get_gaussian_factors(self, mu_list, Sigma_list, components):
+        """ Factorize covariance matrices for evaluating log-densities.
+
+        Each covariance matrix is factorized once as Sigma = L L^T. The
+        inverse factors L^-T are found by triangular solves, so that the
+        Mahalanobis terms for all components reduce to matrix products. When
+        robust is True, SMALL is added to the diagonal before factorizing.
+
+        Returns
+        -------
+        factors : dict
+            factors['mu_list'] : Mean vectors, [n_components, data_dim].
+
+            factors['prec_chol_list'] : Inverse Cholesky factors L^-T,
+                                        [n_components, data_dim, data_dim].
+
+            factors['log_det_list'] : Log-determinants of the covariance
+                                      matrices, [n_components, ].
+
+            factors['log_components'] : Log component proportions.
+        """
+        data_dim = mu_list.shape[1]
+        if self.robust:
+            Sigma_list = Sigma_list + self.SMALL*np.eye(data_dim)
+        try:
+            chol_list = np.linalg.cholesky(Sigma_list)
+        except np.linalg.LinAlgError:
+            raise np.linalg.LinAlgError(self.error_msg)
+        eye = np.eye(data_dim)
+        prec_chol_list = np.array([solve_triangular(chol, eye, lower=True).T
+                                   for chol in chol_list])
+        log_det_list = 2*np.sum(np.log(np.diagonal(chol_list, axis1=1,
+                                                   axis2=2)), axis=1)
+        factors = {'mu_list': mu_list,
+                   'prec_chol_list': prec_chol_list,
+                   'log_det_list': log_det_list,
+                   'log_components': np.log(components)}
+        return self._to_dtype(factors)
+
+    def _to_dtype(self, arrays):
+        """ Cast arrays used in per-example work to self.dtype.
+
+        Factorizations are computed in float64, and only their results are
+        cast, so that products with the data run in self.dtype.
+        """
+        return {key: np.asarray(value, dtype=self.dtype) for key, value in
+                arrays.items()}
+
+    def _get_factors(self, params):
+        """ Factorize parameter dictionary for evaluating log-densities"""
+        return self._get_gaussian_factors(params['mu_list'],
+                                          self._params_to_Sigma(params),
+                                          params['components'])
+
+    def _get_log_prob(self, X, factors):
+        """ Get log p(x, k) for every example and mixture component"""
+        prec_chol_list = factors['prec_chol_list']
+        mu_prec = np.einsum('kd,kde->ke', factors['mu_list'], prec_chol_list)
+        y = X @ prec_chol_list - mu_prec[:, np.newaxis, :]
+        maha = np.sum(y**2, axis=2).T
+        log_prob = -0.5*(X.shape[1]*_LOG_2PI +
+                         factors['log_det_list'] + maha)
+        return log_prob + factors['log_components']
+
+    def _get_log_responsibilities(self, X, factors):
         """ Get log responsibilities for given parameters"""
-        n_examples = X.shape[0]
-        log_r = np.zeros([n_examples, self.n_components])
-        for k, mu, Sigma in zip(range(self.n_components), mu_list,
-                                Sigma_list):
-            try:
-                log_r[:, k] = multivariate_normal.logpdf(X, mu, Sigma)
-            except (np.linalg.linalg.LinAlgError, ValueError):
-                if self.robust:
-                    Sigma_robust = Sigma + self.SMALL*np.eye(self.data_dim)
-                    try:
-                        log_r[:, k] = multivariate_normal.logpdf(X, mu,
-                                                                 Sigma_robust)
-                    except (np.linalg.linalg.LinAlgError, ValueError):
-                        raise np.linalg.linalg.LinAlgError(self.error_msg)
-                else:
-                    raise np.linalg.linalg.LinAlgError(self.error_msg)
-        log_r = log_r + np.log(components)
-        log_r_sum = sp.misc.logsumexp(log_r, axis=1)
+        log_r = self._get_log_prob(X, factors)
+        log_r_sum = logsumexp(log_r, axis=1)
         responsibilities = np.exp(log_r - log_r_sum[:, np.newaxis])
         return log_r_sum, responsibilities
 
-    def _get_log_responsibilities_miss(self, X, mu_list, Sigma_list,
-                                       components, observed_list):
+    def _get_log_prob_pairs(self, X, comps, factors):
+        """ Get log p(x_n, k) for the components k = comps[n, j] only.
+
+        The pairs are grouped by component, and each component is evaluated
+        on the examples that need it, so the cost is proportional to the
+        number of pairs rather than to n_components. Entries of comps equal
+        to -1 are skipped and get log-density -inf.
+        """
+        log_prob = np.full(comps.shape, -np.inf, dtype=self.dtype)
+        log_prob_flat = log_prob.reshape(-1)
+        for k, ids in _group_by_component(comps, self.n_components):
+            log_prob_flat[ids] = self._get_log_prob(
+                X[ids // comps.shape[1]], _component_slice(factors, k)
+                )[:, 0]
+        return log_prob
+
+    def _get_log_prob_miss(self, X, params, patterns, factors=None):
+        """ Get log p(x_obs, k) for examples with missing values.
+
+        The marginal parameters are factorized once for each pattern of
+        observed dimensions, and all examples sharing that pattern are
+        evaluated together. Precomputed factors of params, if given, are
+        used for the fully observed examples, and are required if any
+        example has no observed values.
+        """
+        n_examples, data_dim = X.shape
+        log_r = np.empty([n_examples, self.n_components], dtype=self.dtype)
+        row_bytes = 16 * self.n_components * data_dim
+        for id_obs, id_miss, rows in patterns:
+            if id_obs.size == 0:
+                log_r[rows] = factors['log_components']
+                continue
+            if id_miss.size == 0 and factors is not None:
+                factors_obs = factors
+            else:
+                factors_obs = self._get_factors(
+                    self._marginal_params(params, id_obs)
+                    )
+            for batch in self._gen_batches(rows.size, row_bytes):
+                rows_batch = rows[batch]
+                log_r[rows_batch] = self._get_log_prob(
+                    X[np.ix_(rows_batch, id_obs)], factors_obs
+                    )
+        return log_r
+
+    def _get_log_prob_observed(self, X, missing, params, factors):
+        """ Get log p(x_obs, k) for a batch of examples with missing values.
+
+        missing is the mask np.isnan(X) and factors are the factors of
+        params. By default the examples are grouped by pattern and evaluated
+        under the marginal factors of each pattern.
+        """
+        return self._get_log_prob_miss(X, params,
+                                       self._get_missing_patterns(X), factors)
+
+    def _get_log_responsibilities_miss(self, X, params, patterns):
         """ Get log responsibilities for given parameters"""
-        n_examples = X.shape[0]
-        log_r = np.zeros([n_examples, self.n_components])
-        for n in range(n_examples):
-            id_obs = observed_list[n]
-            row = X[n, :]
-            row_obs = row[id_obs]
-            for k, mu, Sigma in zip(range(self.n_components), mu_list,
-                                    Sigma_list):
-                mu_obs = mu[id_obs]
-                Sigma_obs = Sigma[np.ix_(id_obs, id_obs)]
-                try:
-                    log_r[n, k] = (
-                        multivariate_normal.logpdf(row_obs[np.newaxis, :],
-                                                   mu_obs, Sigma_obs)
-                        )
-                except (np.linalg.linalg.LinAlgError, ValueError):
-                    if self.robust:
-                        Sigma_robust = (
-                            Sigma_obs + self.SMALL*np.eye(self.data_dim)
-                            )
-                        try:
-                            log_r[n, k] = (
-                                multivariate_normal.logpdf(row_obs, mu_obs,
-                                                           Sigma_robust)
-                                )
-                        except (np.linalg.linalg.LinAlgError, ValueError):
-                            raise np.linalg.linalg.LinAlgError(self.error_msg)
-                    else:
-                        raise np.linalg.linalg.LinAlgError(self.error_msg)
-        log_r = log_r + np.log(components)
-        log_r_sum = sp.misc.logsumexp(log_r, axis=1)
+        log_r = self._get_log_prob_miss(X, params, patterns)
+        log_r_sum = logsumexp(log_r, axis=1)
         responsibilities = np.exp(log_r - log_r_sum[:, np.newaxis])
         return log_r_sum, responsibilities
 
-    def _e_step(self, X, params):
+    @staticmethod
+    def _get_missing_patterns(X):
+        """ Group examples by their pattern of missing values.
+
+        Returns
+        -------
+        patterns : list of tuples (id_obs, id_miss, rows)
+            One entry for each distinct pattern, holding the indices of the
+            observed and missing dimensions and of the examples with that
+            pattern.
+        """
+        observed = ~np.isnan(X)
+        masks, inverse = np.unique(observed, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse, minlength=len(masks)))[:-1]
+        patterns = [(np.flatnonzero(mask), np.flatnonzero(~mask), rows)
+                    for mask, rows in zip(masks, np.split(order, splits))]
+        return patterns
+
+    def _get_low_rank_factors(self, mu_list, W_list, Psi_list, components):
+        """ Factorize low-rank plus diagonal covariances W W^T + diag(Psi).
+
+        The Woodbury identity and the matrix determinant lemma reduce the
+        inverse and log-determinant of each covariance to those of the
+        [latent_dim, latent_dim] matrix M = I + W^T Psi^-1 W, so the dense
+        covariance matrices are never formed. When robust is True, SMALL is
+        added to Psi.
+
+        Returns
+        -------
+        factors : dict
+            factors['mu_list'] : Mean vectors, [n_components, data_dim].
+
+            factors['prec_list'] : Inverse noise variances 1 / Psi,
+                                   [n_components, data_dim].
+
+            factors['proj_list'] : Projections Psi^-1 W L^-T, where
+                                   M = L L^T,
+                                   [n_components, data_dim, latent_dim].
+
+            factors['log_det_list'] : Log-determinants of the covariance
+                                      matrices, [n_components, ].
+
+            factors['log_components'] : Log component proportions.
+        """
+        if self.robust:
+            Psi_list = Psi_list + self.SMALL
+        if np.any(Psi_list <= 0):
+            raise np.linalg.LinAlgError(self.error_msg)
+        latent_dim = W_list.shape[2]
+        prec_list = 1 / Psi_list
+        A_list = W_list * prec_list[:, :, np.newaxis]
+        M_list = W_list.transpose(0, 2, 1) @ A_list + np.eye(latent_dim)
+        try:
+            chol_list = np.linalg.cholesky(M_list)
+        except np.linalg.LinAlgError:
+            raise np.linalg.LinAlgError(self.error_msg)
+        eye = np.eye(latent_dim)
+        chol_inv_list = np.array([solve_triangular(chol, eye, lower=True)
+                                  for chol in chol_list])
+        proj_list = A_list @ chol_inv_list.transpose(0, 2, 1)
+        log_det_list = (
+            np.sum(np.log(Psi_list), axis=1) +
+            2*np.sum(np.log(np.diagonal(chol_list, axis1=1, axis2=2)),
+                     axis=1)
+            )
+        factors = {'mu_list': mu_list,
+                   'prec_list': prec_list,
+                   'proj_list': proj_list,
+                   'log_det_list': log_det_list,
+                   'log_components': np.log(components)}
+        return self._to_dtype(factors)
+
+    def _get_diagonal_factors(self, mu_list, var_list, components):
+        """ Factorize diagonal covariances diag(var).
+
+        When robust is True, SMALL is added to the variances.
+
+        Returns
+        -------
+        factors : dict
+            factors['mu_list'] : Mean vectors, [n_components, data_dim].
+
+            factors['prec_list'] : Inverse variances, [n_components,
+                                   data_dim].
+
+            factors['log_det_list'] : Log-determinants of the covariance
+                                      matrices, [n_components, ].
+
+            factors['log_components'] : Log component proportions.
+        """
+        if self.robust:
+            var_list = var_list + self.SMALL
+        if np.any(var_list <= 0):
+            raise np.linalg.LinAlgError(self.error_msg)
+        factors = {'mu_list': mu_list,
+                   'prec_list': 1 / var_list,
+                   'log_det_list': np.sum(np.log(var_list), axis=1),
+                   'log_components': np.log(components)}
+        return self._to_dtype(factors)
+
+    @staticmethod
+    def _get_diagonal_maha(X, mu_list, prec_list):
+        """ sum_d (x_d - mu_d)^2 / var_d for all examples and components"""
+        return ((X**2) @ prec_list.T - 2 * X @ (mu_list*prec_list).T +
+                np.sum(mu_list**2 * prec_list, axis=1))
+
+    def _get_diagonal_log_prob(self, X, factors):
+        """ Get log p(x, k) from diagonal factors"""
+        maha = self._get_diagonal_maha(X, factors['mu_list'],
+                                       factors['prec_list'])
+        log_prob = -0.5*(X.shape[1]*_LOG_2PI +
+                         factors['log_det_list'] + maha)
+        return log_prob + factors['log_components']
+
+    def _get_low_rank_log_prob(self, X, factors):
+        """ Get log p(x, k) from low-rank plus diagonal factors"""
+        mu_list = factors['mu_list']
+        proj_list = factors['proj_list']
+
+        # Diagonal part: sum_d (x_d - mu_d)^2 / Psi_d for all components
+        maha = self._get_diagonal_maha(X, mu_list, factors['prec_list'])
+
+        # Low-rank correction from the Woodbury identity
+        mu_proj = np.einsum('kd,kdl->kl', mu_list, proj_list)
+        t = X @ proj_list - mu_proj[:, np.newaxis, :]
+        maha -= np.sum(t**2, axis=2).T
+        log_prob = -0.5*(X.shape[1]*_LOG_2PI +
+                         factors['log_det_list'] + maha)
+        return log_prob + factors['log_components']
+
+    def _get_low_rank_log_prob_observed(self, X, missing, factors):
+        """ Get log p(x_obs, k) from low-rank plus diagonal factors.
+
+        With P = proj_list and M = L L^T, the marginal covariance of the
+        observed dimensions has M_o = L G L^T, where
+        G = I - P^T diag(m * Psi) P and m is the missing mask. Each example
+        then only needs its [latent_dim, latent_dim] matrix G, which is
+        formed with one product of the mask for every component, so
+        examples are not grouped by their pattern of missing values.
+        """
+        n_examples, data_dim = X.shape
+        observed = ~missing
+        latent_dim = factors['proj_list'].shape[2]
+        log_prob = np.empty([n_examples, self.n_components],
+                            dtype=self.dtype)
+        for k in range(self.n_components):
+            mu = factors['mu_list'][k]
+            prec = factors['prec_list'][k]
+            proj = factors['proj_list'][k]
+            diff = np.where(observed, X - mu, 0.)
+            maha = (diff**2) @ prec
+            t = diff @ proj
+            outer = (proj[:, :, np.newaxis] * proj[:, np.newaxis, :] /
+                     prec[:, np.newaxis, np.newaxis])
+            G = np.eye(latent_dim) - (missing @ outer.reshape(data_dim, -1)
+                                      ).reshape(-1, latent_dim, latent_dim)
+            _, log_det_G = np.linalg.slogdet(G)
+            u = np.linalg.solve(G, t[:, :, np.newaxis])[:, :, 0]
+            maha -= np.sum(t * u, axis=1)
+            log_det = (factors['log_det_list'][k] + log_det_G +
+                       missing @ np.log(prec))
+            log_prob[:, k] = -0.5*(observed.sum(axis=1)*_LOG_2PI +
+                                   log_det + maha)
+        return log_prob + factors['log_components']
+
+    def _gen_batches(self, n_examples, row_bytes):
+        """ Generate slices over examples that fit in working memory.
+
+        row_bytes is the size of the temporary arrays needed per example.
+        """
+        batch_size = max(int(self.working_memory * 2**20 // row_bytes), 1)
+        for start in range(0, n_examples, batch_size):
+            yield slice(start, min(start + batch_size, n_examples))
+
+    def _e_step(self, X, params, factors=None, sample_weight=None):
         """ E-step of the EM-algorithm.
 
         Internal method used to call relevant e-step depending on the
-        presence of missing data.
+        presence of missing data. Precomputed factors of params can be passed
+        to avoid refactorizing when the E-step is run over several chunks.
+        With sample_weight, the responsibilities of each example are scaled
+        by its weight, so the sufficient statistics are weighted sums.
+        sample_ll is unweighted.
         """
         if self.missing_data:
-            return self._e_step_miss(X, params)
+            return self._e_step_miss(X, params, sample_weight)
         else:
-            return self._e_step_no_miss(X, params)
+            return self._e_step_no_miss(X, params, factors, sample_weight)
+
+    def _e_step_chunks(self, data, params, n_candidates=None,
+                       tree_tol=None):
+        """ E-step of the EM-algorithm as a streaming pass over chunks.
+
+        The sufficient statistics are sums over examples, so they are
+        accumulated chunk by chunk and only one chunk is held in memory at a
+        time. With n_candidates, the truncated E-step is run and the
+        candidates of each chunk are kept in data.candidates for the next
+        pass. With tree_tol, the E-step runs over a kd-tree of all examples,
+        built on the first pass and kept in data.tree.
+
+        Returns
+        -------
+        ss : dict
+            Sufficient statistics summed over all chunks.
+
+        ll_sum : float
+            Total log-likelihood of the data under the current parameters,
+            or a lower bound with n_candidates or tree_tol.
+        """
+        if tree_tol is not None:
+            if data.tree is None:
+                data.tree = _KDTree(data.subsample(), data.get_weights(),
+                                    chunk_bytes=self.working_memory * 2**20)
+            return self._e_step_tree(data.tree, params, tree_tol)
+        factors = None if self.missing_data else self._get_factors(params)
+        if n_candidates is not None:
+            neighbours = self._get_neighbours(params, n_candidates + 1)
+            if data.candidates is None:
+                data.candidates = [None] * len(data._keep)
+        ss = None
+        ll_sum = 0.
+        for j, (X, weights) in enumerate(data.iter_weighted()):
+            if n_candidates is None:
+                ss_chunk, sample_ll = self._e_step(X, params, factors,
+                                                   weights)
+            else:
+                ss_chunk, sample_ll, data.candidates[j] = (
+                    self._e_step_truncated(X, params, factors,
+                                           data.candidates[j], n_candidates,
+                                           neighbours, weights)
+                    )
+            ss = ss_chunk if ss is None else _add_ss(ss, ss_chunk)
+            if weights is None:
+                ll_sum += sample_ll.sum()
+            else:
+                ll_sum += sample_ll @ weights
+        return ss, ll_sum
+
+    def _get_neighbours(self, params, n_neighbours):
+        """ Get the n_neighbours components nearest to each component.
+
+        Components are compared by the distance between their means, and
+        each component is its own nearest neighbour.
+
+        Returns
+        -------
+        neighbours : array, [n_components, n_neighbours]
+        """
+        mu_list = params['mu_list']
+        mu_sq = np.sum(mu_list**2, axis=1)
+        dist = mu_sq[:, np.newaxis] - 2 * mu_list @ mu_list.T + mu_sq
+        np.fill_diagonal(dist, -np.inf)
+        n_neighbours = min(n_neighbours, self.n_components)
+        if n_neighbours == self.n_components:
+            return np.argsort(dist, axis=1)
+        return np.argpartition(dist, n_neighbours - 1,
+                               axis=1)[:, :n_neighbours]
+
+    def _e_step_truncated(self, X, params, factors, candidates, n_candidates,
+                          neighbours, sample_weight=None):
+        """ Truncated E-step for complete data.
+
+        Each example only has responsibilities for its n_candidates
+        candidate components, and is given zero responsibility for all
+        others. The candidates are refreshed from the search space of the
+        neighbours of the previous candidates, so only the log-densities of
+        those components are evaluated. With no previous candidates, all
+        components are evaluated. The sufficient statistics are accumulated
+        from the sparse responsibilities, so the cost per example grows with
+        n_candidates rather than n_components. The log-likelihood returned
+        is a lower bound that sums p(x, k) over the candidates only.
+
+        Returns
+        -------
+        ss : dict
+            Sufficient statistics as from _e_step_no_miss.
+
+        sample_ll : array, [nExamples, ]
+            Truncated log-likelihood of each example.
+
+        candidates : array of int, [nExamples, n_candidates]
+            New candidate components of each example.
+        """
+        n_examples, data_dim = X.shape
+        n_search = (self.n_components if candidates is None else
+                    n_candidates * neighbours.shape[1])
+        ss = None
+        sample_ll = np.empty(n_examples)
+        candidates_new = np.empty([n_examples, n_candidates], dtype=int)
+        for batch in self._gen_batches(n_examples, 16 * n_search * data_dim):
+            X_batch = X[batch]
+            if candidates is None:
+                log_prob = self._get_log_prob(X_batch, factors)
+                search = np.broadcast_to(np.arange(self.n_components),
+                                         log_prob.shape)
+            else:
+                # Components in the search space, with repeats skipped
+                search = np.sort(neighbours[candidates[batch]].reshape(
+                    X_batch.shape[0], -1), axis=1)
+                search[:, 1:][search[:, 1:] == search[:, :-1]] = -1
+                log_prob = self._get_log_prob_pairs(X_batch, search, factors)
+
+            # Keep the most probable components as candidates
+            top = np.argpartition(log_prob, -n_candidates,
+                                  axis=1)[:, -n_candidates:]
+            candidates_new[batch] = np.take_along_axis(search, top, axis=1)
+            log_r = np.take_along_axis(log_prob, top, axis=1)
+            sample_ll[batch] = logsumexp(log_r, axis=1)
+            r = _weight_rows(np.exp(log_r - sample_ll[batch][:, np.newaxis]),
+                             sample_weight, batch)
+
+            ss_batch = self._get_sparse_ss(X_batch, candidates_new[batch], r,
+                                           params)
+            ss = ss_batch if ss is None else _add_ss(ss, ss_batch)
+        return ss, sample_ll, candidates_new
+
+    def _get_sparse_ss(self, X, comps, r, params):
+        """ Sufficient statistics from sparse responsibilities.
+
+        r[n, j] is the responsibility of component comps[n, j] for example n,
+        and all other responsibilities are zero. The statistics of each
+        component are those of the examples it is responsible for.
+        """
+        ss = self._get_ss(X[:0], np.zeros([0, self.n_components],
+                                          dtype=self.dtype), params)
+        r_flat = r.ravel()
+        for k, ids in _group_by_component(np.where(r > 0, comps, -1),
+                                          self.n_components):
+            ss_k = self._get_ss(X[ids // comps.shape[1]],
+                                r_flat[ids, np.newaxis],
+                                _component_slice(params, k))
+            for key in ss:
+                ss[key][k] += ss_k[key][0]
+        return ss
+
+    def _get_box_maha_bounds(self, lo, hi, params):
+        """ Bounds on the Mahalanobis distances of the points of boxes.
+
+        With Sigma = L L^T, a point c + h * u of the box with centre c and
+        half-widths h, where |u_d| <= 1, is whitened to
+        L^-1 (c - mu) + sum_d h_d u_d L^-1 e_d. Its distance from the
+        origin is within sum_d h_d |L^-1 e_d| of that of the whitened
+        centre.
+
+        Returns
+        -------
+        maha_min, maha_max : array, [n_boxes, n_components]
+        """
+        Sigma_list = self._params_to_Sigma(params)
+        prec_chol_list = self._get_gaussian_factors(
+            params['mu_list'], Sigma_list, params['components']
+            )['prec_chol_list']
+        centre = (lo + hi) / 2
+        y = np.einsum('bkd,kde->bke',
+                      centre[:, np.newaxis, :] - params['mu_list'],
+                      prec_chol_list)
+        dist = np.sqrt(np.sum(y**2, axis=2))
+        radius = ((hi - lo) / 2) @ np.sqrt(np.sum(prec_chol_list**2,
+                                                  axis=2)).T
+        return np.maximum(dist - radius, 0)**2, (dist + radius)**2
+
+    def _get_prunable(self, lo, hi, params, factors, tol):
+        """ Whether the responsibilities vary by less than tol in boxes.
+
+        Bounds on the log-densities over each box bound every
+        responsibility from above by its ratio with the lowest densities of
+        the other components, and from below likewise.
+        """
+        maha_min, maha_max = self._get_box_maha_bounds(lo, hi, params)
+        log_norm = factors['log_components'] - 0.5*(
+            lo.shape[1]*_LOG_2PI + factors['log_det_list'])
+        log_hi = log_norm - 0.5*maha_min
+        log_lo = log_norm - 0.5*maha_max
+        own = np.eye(self.n_components, dtype=bool)
+        r_max = np.exp(log_hi - logsumexp(
+            np.where(own, log_hi[:, :, np.newaxis], log_lo[:, np.newaxis, :]),
+            axis=2))
+        r_min = np.exp(log_lo - logsumexp(
+            np.where(own, log_lo[:, :, np.newaxis], log_hi[:, np.newaxis, :]),
+            axis=2))
+        return np.all(r_max - r_min < tol, axis=1)
+
+    def _get_node_ss(self, tree, level, nodes, params, factors):
+        """ Sufficient statistics of tree nodes with shared
+        responsibilities.
+
+        The examples of a node are given the responsibilities
+        r_k proportional to exp(mean over the examples of log p(x, k)),
+        which maximize the lower bound on their log-likelihood among shared
+        responsibilities. The means and the statistics are sums over the
+        weighted points of the node's moments.
+
+        Returns
+        -------
+        ss : dict
+            Sufficient statistics summed over the nodes.
 
-    def _e_step_no_miss(self, X, params):
+        ll_sum : float
+            Lower bound on the log-likelihood of the examples of the nodes.
+        """
+        count = tree.count[level][nodes]
+        points = (tree.mean[level][nodes][:, np.newaxis, :] +
+                  tree.offsets[level][nodes])
+        n_nodes, n_points, data_dim = points.shape
+        points = points.reshape(-1, data_dim)
+        log_prob = self._get_log_prob(points, factors).reshape(
+            n_nodes, n_points, self.n_components)
+        mean_log_prob = log_prob.mean(axis=1)
+        node_ll = logsumexp(mean_log_prob, axis=1)
+        r = np.exp(mean_log_prob - node_ll[:, np.newaxis])
+        r = np.repeat(r * (count / n_points)[:, np.newaxis], n_points, axis=0)
+        return self._get_ss(points, r, params), count @ node_ll
+
+    def _e_step_tree(self, tree, params, tol):
+        """ E-step over a kd-tree of complete data.
+
+        The tree is descended from its root. A node whose responsibilities
+        provably vary by less than tol over its bounding box is not
+        descended further, and its examples share one set of
+        responsibilities, computed with the statistics from the node's
+        moments in O(dataDim) evaluations. The examples of leaves that can
+        not be pruned are evaluated one by one. The cost per iteration
+        grows with the number of nodes visited rather than with nExamples
+        when the components are well separated relative to the node
+        sizes.
+
+        Returns
+        -------
+        ss : dict
+            Sufficient statistics of all examples.
+
+        ll_sum : float
+            Lower bound on the total log-likelihood, exact for the examples
+            evaluated one by one.
+        """
+        factors = self._get_factors(params)
+        data_dim = tree.X.shape[1]
+        ss = self._get_ss(tree.X[:0], np.zeros([0, self.n_components],
+                                               dtype=self.dtype), params)
+        ll_sum = 0.
+        nodes = np.zeros(1, dtype=int)
+        row_bytes = 16 * self.n_components * (self.n_components +
+                                              4 * data_dim**2)
+        for level in range(tree.depth + 1):
+            split = [nodes[:0]]
+            for batch in self._gen_batches(nodes.size, row_bytes):
+                nodes_batch = nodes[batch]
+                prune = self._get_prunable(tree.lo[level][nodes_batch],
+                                           tree.hi[level][nodes_batch],
+                                           params, factors, tol)
+                if prune.any():
+                    ss_nodes, ll_nodes = self._get_node_ss(
+                        tree, level, nodes_batch[prune], params, factors)
+                    ss = _add_ss(ss, ss_nodes)
+                    ll_sum += ll_nodes
+                split.append(nodes_batch[~prune])
+            nodes = np.concatenate(split)
+            if level < tree.depth:
+                nodes = np.stack([2*nodes, 2*nodes + 1], axis=1).ravel()
+
+        # Examples of the leaves that were not pruned
+        starts = tree.bounds[tree.depth][nodes]
+        sizes = tree.bounds[tree.depth][nodes + 1] - starts
+        rows = (np.repeat(starts - np.cumsum(sizes) + sizes, sizes) +
+                np.arange(sizes.sum()))
+        if rows.size > 0:
+            if tree.weights is None:
+                ss_leaves, sample_ll = self._e_step_no_miss(tree.X[rows],
+                                                            params, factors)
+                ll_sum += sample_ll.sum()
+            else:
+                ss_leaves, sample_ll = self._e_step_no_miss(
+                    tree.X[rows], params, factors, tree.weights[rows])
+                ll_sum += sample_ll @ tree.weights[rows]
+            ss = _add_ss(ss, ss_leaves)
+        return ss, ll_sum
+
+    def _e_step_no_miss(self, X, params, factors=None, sample_weight=None):
         """ E-Step of the EM-algorithm for complete data.
 
         The E-step takes the existing parameters, for the components, bias
@@ -144,6 +1310,14 @@ class BaseModel(object):
                                    the probability that the data comes from
                                    each component
 
+        factors : dict, optional
+            Factors of params from _get_factors. Computed if not given.
+
+        sample_weight : array, [nExamples, ], optional
+            Weight of each example, by which its responsibilities are scaled
+            in the sufficient statistics. All examples have weight 1 if not
+            given.
+
         Returns
         -------
         ss : dict
@@ -163,7 +1337,7 @@ class BaseModel(object):
         """
         raise NotImplementedError()
 
-    def _e_step_miss(self, X, params):
+    def _e_step_miss(self, X, params, sample_weight=None):
         """ E-Step of the EM-algorithm for missing data.
 
         The E-step takes the existing parameters, for the components, bias
@@ -191,6 +1365,11 @@ class BaseModel(object):
                                    the probability that the data comes from
                                    each component
 
+        sample_weight : array, [nExamples, ], optional
+            Weight of each example, by which its responsibilities are scaled
+            in the sufficient statistics. All examples have weight 1 if not
+            given.
+
         Returns
         -------
         ss : dict
@@ -210,6 +1389,18 @@ class BaseModel(object):
         """
         raise NotImplementedError()
 
+    def _get_ss(self, X, r, params):
+        """ Sufficient statistics of complete data for given
+        responsibilities.
+
+        r holds the responsibilities of the components of params for the
+        examples X, [nExamples, n_components]. The statistics are sums over
+        examples, so they can be accumulated over batches of examples, or
+        computed for one component at a time from params restricted to it.
+        They are returned as float64 arrays whatever the dtype.
+        """
+        raise NotImplementedError()
+
     def _m_step(self, ss, params):
         """ M-Step of the EM-algorithm.
 
@@ -251,68 +1442,556 @@ class BaseModel(object):
         """
         raise NotImplementedError()
 
+    def _m_step_truncated(self, ss, params):
+        """ M-step for truncated EM.
+
+        A component that is no example's candidate has no sufficient
+        statistics. Such components keep their parameters and proportions,
+        so they can be taken up again as candidates, and the other
+        components are updated by the M-step and share the remaining
+        proportion.
+        """
+        active = ss['r_list'] > 0
+        if active.all():
+            return self._m_step(ss, params)
+        params_active = self._m_step(
+            {key: value[active] for key, value in ss.items()},
+            {key: value[active] for key, value in params.items()}
+            )
+        params_new = {key: value.copy() for key, value in params.items()}
+        for key, value in params_active.items():
+            params_new[key][active] = value
+        params_new['components'][active] *= (
+            1 - params['components'][~active].sum()
+            )
+        return params_new
+
     def _params_to_Sigma(self, params):
         """ Converts parameter dictionary to covariance matrix list"""
         raise NotImplementedError()
 
-    def _init_params(self, X, init_method='kmeans'):
+    def _marginal_params(self, params, id_obs):
+        """ Parameters of the marginal distribution over dimensions id_obs"""
+        raise NotImplementedError()
+
+    def _n_parameters(self):
+        """ Number of free parameters of the model"""
+        raise NotImplementedError()
+
+    def _init_params(self, X, init_method='kmeans', random_state=None):
         """ Initialize params"""
         raise NotImplementedError()
 
-    def fit(self, X, params_init=None, init_method='kmeans'):
+    def _em(self, data, params, e_step=None, best_ll=None, prune_tol=np.inf,
+            verbose=False, callbacks=None, accelerate=False,
+            n_candidates=None, tree_tol=None):
+        """ Run EM iterations from the parameters params.
+
+        e_step computes the summed sufficient statistics and log-likelihood
+        for given parameters, and defaults to a streaming pass over data.
+        If best_ll is given, it is a shared array of the best log-likelihood
+        reached at each iteration by any run, and the run is abandoned when
+        its log-likelihood falls more than prune_tol below the best. The
+        callbacks are called after every iteration, and the run stops when
+        one of them asks to.
+
+        With accelerate, once three EM iterates have been evaluated, the
+        parameters are extrapolated along them with SQUAREM. The
+        extrapolated parameters are kept only if their log-likelihood is at
+        least that of the last EM iterate, and are then followed by an EM
+        step. If they decrease the likelihood, or they or the EM step from
+        them are ill-conditioned, EM continues with the EM step from the
+        last EM iterate, whose statistics are kept. Each evaluation of
+        extrapolated parameters counts as an iteration.
+
+        With n_candidates, the default E-step is truncated to the candidate
+        components of each example, starting from an E-step over all
+        components. With tree_tol, the default E-step runs over a kd-tree
+        of the data.
+
+        Returns
+        -------
+        params : dict
+            Fitted parameters, or None if the run was abandoned.
+
+        ll : float
+            Mean log-likelihood per dimension at the last iteration.
+
+        n_iter : int
+            Number of iterations run.
+
+        ss : dict
+            Summed sufficient statistics of the E-step that params were
+            computed from, or of params themselves if EM converged. None if
+            the run was abandoned.
+        """
+        e_step_default = e_step is None
+        if e_step_default:
+            data.candidates = None
+
+            def e_step(params):
+                return self._e_step_chunks(data, params, n_candidates,
+                                           tree_tol)
+        m_step = self._m_step
+        if n_candidates is not None:
+            m_step = self._m_step_truncated
+
+        monitor = None
+        if callbacks:
+            profile = e_step_default and any(
+                getattr(callback, 'uses_log_prob_time', True)
+                for callback in callbacks)
+            monitor = _Monitor(self, callbacks, profile=profile)
+
+        # EM iterates since the last extrapolation. From an extrapolation
+        # until the EM step from the extrapolated parameters is evaluated,
+        # fallback holds the last EM iterate with its statistics and
+        # log-likelihood
+        iterates = [params]
+        fallback = None
+        extrapolated = False
+        step_max = 1.
+        ss_fit = None
+        try:
+            oldL = -np.inf
+            for i in range(self.max_iter):
+                if monitor is not None:
+                    monitor.begin_iteration()
+
+                # E-Step
+                try:
+                    ss, ll_sum = e_step(params)
+                    ll = ll_sum / self.n_examples / self.data_dim
+                except np.linalg.LinAlgError:
+                    if fallback is None:
+                        raise
+                    ll = -np.inf
+                if monitor is not None:
+                    monitor.end_e_step()
+
+                # Return to the last EM iterate if the extrapolated
+                # parameters, or the EM step from them, decrease the
+                # likelihood or are ill-conditioned
+                rejected = fallback is not None and not ll >= fallback[2]
+                if rejected:
+                    step_max = max(1., step_max / 4)
+                    params, ss, oldL = fallback
+                    fallback = None
+                    iterates = [params]
+                elif fallback is not None and not extrapolated:
+                    fallback = None
+                extrapolated = False
+
+                if not rejected:
+                    change = ll - oldL
+
+                    # Break if change in likelihood is small
+                    converged = np.abs(change) < self.tol
+                    if best_ll is not None:
+                        best = _update_best_ll(best_ll, i, ll, fill=converged)
+                        if ll < best - prune_tol:
+                            return None, ll, i + 1, None
+                    if converged:
+                        ss_fit = ss
+                        if monitor is not None:
+                            monitor.end_iteration(i, ll, change,
+                                                  params['components'],
+                                                  m_step=False)
+                        break
+                    oldL = ll
+                components = params['components']
+
+                # SQUAREM extrapolation from the last three EM iterates,
+                # followed by an EM step if it is accepted
+                extrapolation = None
+                if accelerate and len(iterates) == 3 and not rejected:
+                    extrapolation, alpha = _squarem_extrapolate(iterates,
+                                                                step_max)
+                    if alpha == -step_max:
+                        step_max *= 4
+                    if alpha >= -1:
+                        extrapolation = None
+                    iterates = [params]
+                if extrapolation is not None:
+                    fallback = (params, ss, ll)
+                    params = extrapolation
+                    extrapolated = True
+                    iterates = [params]
+                else:
+                    # M-step
+                    try:
+                        params_new = m_step(ss, params)
+                    except np.linalg.LinAlgError:
+                        if fallback is None:
+                            raise
+                        params, ss, oldL = fallback
+                        fallback = None
+                        iterates = [params]
+                        params_new = m_step(ss, params)
+                    params = params_new
+                    ss_fit = ss
+                    if accelerate:
+                        iterates.append(params)
+
+                if not rejected and monitor is not None and (
+                        monitor.end_iteration(i, ll, change, components)):
+                    break
+
+            else:
+                if verbose:
+                    print("EM algorithm did not converge within the " +
+                          "specified tolerance. You might want to increase " +
+                          "the number of iterations.")
+        finally:
+            if monitor is not None:
+                monitor.close()
+
+        # Extrapolated parameters that were never evaluated are dropped
+        if extrapolated:
+            params = fallback[0]
+        return params, ll, i + 1, ss_fit
+
+    def _fit_restart(self, data, random_state, init_method, init_size,
+                     prune_tol, accelerate=False, n_candidates=None,
+                     tree_tol=None, best_ll=None, callbacks=None):
+        """ Initialise with the given seed and run EM.
+
+        Returns (params, ll, n_iter, ss) as _em, with params None if the run
+        was abandoned or its covariance matrices became ill-conditioned.
+        """
+        try:
+            params = self._init_params(data.subsample(init_size),
+                                       init_method, random_state)
+            return self._em(data, _stack_params(params), best_ll=best_ll,
+                            prune_tol=prune_tol, callbacks=callbacks,
+                            accelerate=accelerate, n_candidates=n_candidates,
+                            tree_tol=tree_tol)
+        except np.linalg.LinAlgError:
+            return None, -np.inf, 0, None
+
+    def _fit_restarts(self, X, data, n_init, init_method, init_size,
+                      n_jobs, prune_tol, accelerate=False, n_candidates=None,
+                      tree_tol=None, callbacks=None, sample_weight=None):
+        """ Run n_init initialisations and keep the best EM run"""
+        rng = check_random_state(self.random_state)
+        seeds = rng.randint(np.iinfo(np.int32).max, size=n_init)
+        prune_tol = np.inf if prune_tol is None else prune_tol
+        tasks = [(seed, init_method, init_size, prune_tol, accelerate,
+                  n_candidates, tree_tol) for seed in seeds]
+        best_ll = multiprocessing.Array('d', [-np.inf] * self.max_iter)
+
+        shared = pool = None
+        try:
+            if n_jobs is None or n_jobs == 1:
+                results = (self._fit_restart(data, *task, best_ll=best_ll,
+                                             callbacks=callbacks)
+                           for task in tasks)
+            else:
+                shared = _SharedData(X, self.dtype)
+                pool = multiprocessing.Pool(
+                    min(n_jobs, n_init), initializer=_init_worker,
+                    initargs=(self, shared.source, best_ll, sample_weight)
+                    )
+                results = pool.imap(_restart_worker, tasks)
+
+            best_params, best, best_ss = None, -np.inf, None
+            for j, (params, ll, n_iter, ss) in enumerate(results):
+                if self.verbose:
+                    if ll == -np.inf:
+                        print("Init {:d}   Covariance matrix "
+                              "ill-conditioned".format(j), flush=True)
+                    elif params is None:
+                        print("Init {:d}   Abandoned after {:d} "
+                              "iterations   NLL: {:.4f}".format(j, n_iter,
+                                                                -ll),
+                              flush=True)
+                    else:
+                        print("Init {:d}   Iterations: {:d}   "
+                              "NLL: {:.4f}".format(j, n_iter, -ll),
+                              flush=True)
+                if params is not None and ll > best:
+                    best_params, best, best_ss = params, ll, ss
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if shared is not None:
+                shared.close()
+
+        if best_params is None:
+            raise np.linalg.LinAlgError(self.error_msg)
+        return best_params, best, best_ss
+
+    def fit(self, X, params_init=None, init_method='kmeans', init_size=None,
+            n_jobs=None, n_init=1, prune_tol=0.5, callbacks=None,
+            accelerate=False, n_candidates=None, tree_tol=None,
+            sample_weight=None):
         """ Fit the model using EM with data X.
 
         Args
         ----
-        X : array, [nExamples, nFeatures]
+        X : array, [nExamples, nFeatures], np.memmap, str or iterable
             Matrix of training data, where nExamples is the number of
-            examples and nFeatures is the number of features.
+            examples and nFeatures is the number of features. Data that does
+            not fit in memory can be given as a memory-mapped array, the path
+            to a .npy file, or a re-iterable collection of arrays with the
+            examples split between them. Each E-step is then a streaming pass
+            that accumulates the sufficient statistics chunk by chunk.
+            Arrays are read in chunks of working_memory MiB, so a
+            memory-mapped array gives the same fit as the array in memory.
+
+        init_size : int, optional
+            Number of evenly spaced examples used to initialise the
+            parameters. Defaults to at most 100000 examples whatever the
+            form of X, so an array, its memory-mapped copy and its chunks
+            are initialised alike. Ignored if params_init is given.
+
+        n_jobs : int, optional
+            Number of processes. With a single initialisation, the examples
+            are split into n_jobs shards held in shared memory (or reopened
+            from the memory-mapped file), and the sufficient statistics of
+            the shards are added up before each M-step. With n_init > 1, the
+            restarts run concurrently instead. -1 uses all CPUs. Requires an
+            array, a memory-mapped array or the path to a .npy file.
+
+        n_init : int
+            Number of initialisations, each seeded from random_state and
+            followed by an EM run. The run with the best training
+            log-likelihood is kept. Ignored if params_init is given.
+
+        prune_tol : float or None
+            With n_init > 1, a run is abandoned when its mean log-likelihood
+            per dimension falls more than prune_tol below the best reached by
+            any run after the same number of iterations. None disables
+            pruning. When restarts run concurrently, which runs are pruned
+            depends on their relative progress.
+
+        callbacks : list of Callback, optional
+            Objects from pyMM.callbacks notified at the start and end of the
+            fit and after every EM iteration, with timings of the E- and
+            M-steps. A callback can stop EM early. With n_init > 1, only
+            restarts run in this process are reported.
+
+        accelerate : bool
+            Whether to accelerate EM with SQUAREM extrapolation. After every
+            two EM steps the parameters are extrapolated along the EM
+            sequence, in a space where variances and component proportions
+            are log-transformed and covariance matrices are Cholesky
+            factorized so that constraints hold. Extrapolations that would
+            decrease the likelihood are discarded. This often reduces the
+            number of iterations needed for slowly converging models such as
+            MPPCA and MFA several-fold.
+
+        n_candidates : int, optional
+            Number of candidate components per example for truncated EM.
+            Each example only takes responsibility from its candidates, the
+            components of highest posterior among the neighbours of its
+            previous candidates (its n_candidates + 1 nearest components by
+            distance between means). Only those log-densities are evaluated
+            and the sufficient statistics are accumulated from the sparse
+            responsibilities, so an iteration costs O(nExamples *
+            n_candidates^2) log-density evaluations rather than
+            O(nExamples * n_components). The first iteration evaluates all
+            components. The training log-likelihood is then a lower bound
+            summed over the candidates. Useful with many components, e.g.
+            n_candidates=5 with n_components=1000. Requires data without
+            missing values.
+
+        tree_tol : float, optional
+            Tolerance for tree-accelerated EM, for large numbers of
+            low-dimensional examples. A kd-tree of the examples, with the
+            bounding box and first and second moments of every node, is
+            built once. In each E-step, the examples of a node share their
+            responsibilities if bounds over the node's box show that no
+            responsibility varies by more than tree_tol within it, and
+            their statistics then come from the node's moments. Larger
+            values visit fewer nodes and give a coarser approximation, and
+            0 evaluates every example. The training log-likelihood is then
+            a lower bound. The tree holds a reordered copy of the data in
+            memory. Requires data without missing values, and can not be
+            combined with n_candidates.
+
+        sample_weight : array, [nExamples, ], optional
+            Non-negative weight of each example, e.g. the number of times a
+            row occurs when duplicates are collapsed, the counts of a
+            pre-aggregated histogram or importance weights of a subsample.
+            The responsibilities of each example are scaled by its weight in
+            the sufficient statistics, so an integer weight is equivalent to
+            repeating the example. Examples of weight zero are skipped. The
+            training log-likelihood is the weighted mean, and the total
+            weight replaces the number of examples in bic and aic. The
+            initialisation is unweighted.
         """
-        if np.isnan(X).any():
-            self.missing_data = True
+        callbacks = list(callbacks or [])
+        run_callbacks = callbacks
+        if self.verbose:
+            run_callbacks = callbacks + [ProgressPrinter()]
+        for callback in run_callbacks:
+            callback.on_fit_begin(self)
+        try:
+            self._fit(X, params_init, init_method, init_size, n_jobs, n_init,
+                      prune_tol, accelerate, n_candidates, tree_tol,
+                      sample_weight, callbacks, run_callbacks)
+        finally:
+            for callback in run_callbacks:
+                callback.on_fit_end(self)
+
+    def _fit(self, X, params_init, init_method, init_size, n_jobs, n_init,
+             prune_tol, accelerate, n_candidates, tree_tol, sample_weight,
+             restart_callbacks, callbacks):
+        """ Body of fit. The restarts are reported to restart_callbacks and
+        a single run to callbacks.
+        """
+        data = _DataChunks(X, self.working_memory * 2**20, self.dtype,
+                           sample_weight)
+        if data.n_examples == 0:
+            raise ValueError('Training data contains no observed examples')
+        self.missing_data = data.missing_data
+        self.data_dim = data.data_dim
+        self.n_examples = data.total_weight
+
+        if init_size is None:
+            init_size = 100000
+        if n_jobs is not None and n_jobs < 0:
+            n_jobs = os.cpu_count()
+        if n_candidates is not None:
+            if n_candidates < 1:
+                raise ValueError('n_candidates must be at least 1')
+            if self.missing_data:
+                raise ValueError('Truncated EM requires data without ' +
+                                 'missing values')
+            if n_candidates >= self.n_components:
+                n_candidates = None
+        if tree_tol is not None:
+            if self.missing_data:
+                raise ValueError('Tree-accelerated EM requires data ' +
+                                 'without missing values')
+            if n_candidates is not None:
+                raise ValueError('tree_tol can not be combined with ' +
+                                 'n_candidates')
+
+        if params_init is None and n_init > 1:
+            params, ll, ss = self._fit_restarts(X, data, n_init, init_method,
+                                                init_size, n_jobs, prune_tol,
+                                                accelerate, n_candidates,
+                                                tree_tol, restart_callbacks,
+                                                sample_weight)
         else:
-            self.missing_data = False
+            if params_init is None:
+                random_state = check_random_state(self.random_state).randint(
+                    np.iinfo(np.int32).max
+                    )
+                params = self._init_params(data.subsample(init_size),
+                                           init_method, random_state)
+            else:
+                params = params_init
+            params = _stack_params(params)
+
+            pool = None
+            if n_jobs is not None and n_jobs > 1:
+                pool = _EStepPool(self, X, n_jobs, n_candidates, tree_tol,
+                                  sample_weight)
+            try:
+                params, ll, _, ss = self._em(
+                    data, params, e_step=None if pool is None else
+                    pool.e_step, verbose=self.verbose, callbacks=callbacks,
+                    accelerate=accelerate, n_candidates=n_candidates,
+                    tree_tol=tree_tol
+                    )
+            finally:
+                if pool is not None:
+                    pool.close()
 
-        # Check for missing values and remove if whole row is missing
-        X = X[~np.isnan(X).all(axis=1), :]
-        n_examples, data_dim = np.shape(X)
-        self.data_dim = data_dim
-        self.n_examples = n_examples
+        # Update Object attributes
+        self.params = params
+        self.trainNll = ll
+        self.isFitted = True
 
-        if params_init is None:
-            params = self._init_params(X, init_method)
-        else:
-            params = params_init
+        # Running statistics per unit of weight for partial_fit, with the
+        # step schedule set by the first batch
+        self._ss = {key: value / self.n_examples for key, value in ss.items()}
+        self._n_steps = None
 
-        oldL = -np.inf
-        for i in range(self.max_iter):
+    def partial_fit(self, X, params_init=None, init_method='kmeans',
+                    step_alpha=0.7, sample_weight=None):
+        """ Update the model with a batch of data using stepwise EM.
 
-            # E-Step
-            ss, sample_ll = self._e_step(X, params)
+        The model keeps running averages of the sufficient statistics per
+        example. The statistics of each batch are mixed in as
 
-            # Evaluate likelihood
-            ll = sample_ll.mean() / self.data_dim
-            if self.verbose:
-                print("Iter {:d}   NLL: {:.4f}   Change: {:.4f}".format(i,
-                      -ll, -(ll-oldL)), flush=True)
+            ss <- (1 - step) * ss + step * ss_batch,
 
-            # Break if change in likelihood is small
-            if np.abs(ll - oldL) < self.tol:
-                break
-            oldL = ll
+        with step = (k + 2)^-step_alpha after k previous updates, and the
+        parameters are then updated by an M-step. Memory use does not grow
+        with the number of batches, so the model can learn from a stream of
+        mini-batches. The first batch initialises the parameters, unless the
+        model has already been fitted, in which case learning continues from
+        the fitted parameters. After fit, the running statistics are those
+        of the training data, the first batch is mixed in with a step equal
+        to its share of the total weight, and the step then decays as if the
+        training data had come in batches of that size.
 
-            # M-step
-            params = self._m_step(ss, params)
+        Args
+        ----
+        X : array, [nExamples, nFeatures]
+            Batch of training data, where nExamples is the number of
+            examples and nFeatures is the number of features. May contain
+            missing values.
 
-        else:
-            if self.verbose:
-                print("EM algorithm did not converge within the specified" +
-                      " tolerance. You might want to increase the number of" +
-                      " iterations.")
+        step_alpha : float
+            Rate at which the step size decays. Values in (0.5, 1] guarantee
+            convergence; smaller values adapt faster to new data.
 
-        # Update Object attributes
-        self.params = params
-        self.trainNll = ll
+        sample_weight : array, [nExamples, ], optional
+            Non-negative weight of each example of the batch, as in fit.
+            The batch statistics are then averaged over its total weight.
+        """
+        data = _DataChunks(X, self.working_memory * 2**20, self.dtype,
+                           sample_weight)
+        if data.n_examples == 0:
+            raise ValueError('Batch contains no observed examples')
+        if self.isFitted and data.data_dim != self.data_dim:
+            raise ValueError('Batch has {:d} features, but the model was '
+                             'fitted with {:d}'.format(data.data_dim,
+                                                       self.data_dim))
+        self.missing_data = data.missing_data
+        self.data_dim = data.data_dim
+
+        if self.isFitted:
+            if self._ss is None:
+                raise ValueError('The model has no running statistics to ' +
+                                 'continue from. Fit it again, or save it ' +
+                                 'with this version of pyMM')
+            params = self.params
+            self.n_examples += data.total_weight
+        else:
+            if params_init is None:
+                params = self._init_params(data.subsample(), init_method,
+                                           self.random_state)
+            else:
+                params = params_init
+            params = _stack_params(params)
+            self.n_examples = data.total_weight
+
+        # E-step on the batch, averaged over its examples
+        ss, ll_sum = self._e_step_chunks(data, params)
+        ss = {key: value / data.total_weight for key, value in ss.items()}
+
+        # Stepwise update of the running statistics
+        if self._ss is not None:
+            if self._n_steps is None:
+                # Solve (k + 2)^-step_alpha = total_weight / n_examples
+                self._n_steps = ((self.n_examples / data.total_weight)**(
+                    1 / step_alpha) - 2)
+            step = (self._n_steps + 2)**(-step_alpha)
+            ss = {key: (1 - step) * self._ss[key] + step * ss[key]
+                  for key in ss}
+            self._n_steps += 1
+        self._ss = ss
+
+        # M-step
+        self.params = self._m_step(ss, params)
+        self.trainNll = ll_sum / data.total_weight / self.data_dim
         self.isFitted = True
 
     def sample(self, n_samples=1):
@@ -338,26 +2017,121 @@ class BaseModel(object):
             print("Model is not yet fitted. First use fit to learn the " +
                   "model params.")
         else:
-            components = self.params['components']
-            mu_list = self.params['mu_list']
-            Sigma_list = self._params_to_Sigma(self.params)
-            components_cumsum = np.cumsum(components)
-            samples = np.zeros([n_samples, self.data_dim])
-            for n in range(n_samples):
-                r = np.random.rand(1)
-                z = np.argmin(r > components_cumsum)
-                samples[n] = rd.multivariate_normal(mu_list[z], Sigma_list[z])
-            return samples
+            return self._sample(self.params, n_samples)
+
+    def _get_sampling_factors(self, params, noisy=True):
+        """ Factors from which samples of each component are drawn.
+
+        Returns a dict with the mean vectors 'mu_list' and any of
+        'chol_list' (Cholesky factors of the covariances), 'std_list'
+        (standard deviations of independent noise) and 'W_list' (factor
+        loadings for latent variables).
+        """
+        Sigma_list = self._params_to_Sigma(params)
+        if self.robust:
+            Sigma_list = Sigma_list + self.SMALL*np.eye(self.data_dim)
+        try:
+            chol_list = np.linalg.cholesky(Sigma_list)
+        except np.linalg.LinAlgError:
+            raise np.linalg.LinAlgError(self.error_msg)
+        return {'mu_list': params['mu_list'], 'chol_list': chol_list}
+
+    def _sample_component(self, factors, k, n_samples):
+        """ Draw n_samples examples from mixture component k"""
+        mu = factors['mu_list'][k]
+        samples = np.repeat(mu[np.newaxis, :], n_samples, axis=0)
+        if 'chol_list' in factors:
+            samples += (rd.standard_normal([n_samples, mu.size]) @
+                        factors['chol_list'][k].T)
+        if 'std_list' in factors:
+            samples += (factors['std_list'][k] *
+                        rd.standard_normal([n_samples, mu.size]))
+        if 'W_list' in factors:
+            W = factors['W_list'][k]
+            samples += rd.standard_normal([n_samples, W.shape[1]]) @ W.T
+        return samples
+
+    def _sample(self, params, n_samples, noisy=True):
+        """ Draw n_samples examples from the mixture.
+
+        The number of samples from each component is drawn from a single
+        multinomial. Each component's samples are then drawn in blocks
+        from factors computed once per set of parameters, and scattered
+        to random rows so that the output is in random order.
+        """
+        cache = getattr(self, '_sampling_cache', None)
+        if cache is None or cache[0] is not params or cache[1] != noisy:
+            cache = (params, noisy,
+                     self._get_sampling_factors(params, noisy))
+            self._sampling_cache = cache
+        factors = cache[2]
+
+        components = params['components']
+        counts = rd.multinomial(n_samples, components / components.sum())
+        order = rd.permutation(n_samples)
+        samples = np.empty([n_samples, self.data_dim])
+        row_bytes = 24 * self.data_dim
+        start = 0
+        for k, n_k in enumerate(counts):
+            for batch in self._gen_batches(n_k, row_bytes):
+                rows = order[start + batch.start:start + batch.stop]
+                samples[rows] = self._sample_component(factors, k, rows.size)
+            start += n_k
+        return samples
+
+    def _get_fitted_factors(self):
+        """ Factors of self.params, computed once per set of parameters.
+
+        Models loaded with load_model come with their saved factors
+        already in the cache.
+        """
+        cache = getattr(self, '_factors_cache', None)
+        if cache is None or cache[0] is not self.params:
+            cache = (self.params, self._get_factors(self.params))
+            self._factors_cache = cache
+        return cache[1]
+
+    def compile(self):
+        """ Freeze the fitted model into a Scorer.
+
+        The scorer caches the factors of the fitted parameters, and its
+        score_samples, score, predict and predict_proba do no factorization
+        or sufficient-statistic work per call.
+        """
+        return Scorer(self)
+
+    def _score_samples(self, X):
+        """ Log-likelihood of each example, without sufficient statistics.
+
+        Only the log-densities are evaluated, in batches that fit in working
+        memory. Examples with missing values are scored under the marginal
+        distribution of their observed dimensions, whether or not the model
+        was fitted with missing data.
+        """
+        factors = self._get_fitted_factors()
+        n_examples = X.shape[0]
+        sample_ll = np.empty(n_examples, dtype=self.dtype)
+        row_bytes = 16 * self.n_components * self.data_dim
+        for batch in self._gen_batches(n_examples, row_bytes):
+            X_batch = X[batch]
+            missing = np.isnan(X_batch)
+            if missing.any():
+                log_prob = self._get_log_prob_observed(X_batch, missing,
+                                                       self.params, factors)
+            else:
+                log_prob = self._get_log_prob(X_batch, factors)
+            sample_ll[batch] = logsumexp(log_prob, axis=1)
+        return sample_ll
 
     def score_samples(self, X):
         if not self.isFitted:
             print("Model is not yet fitted. First use fit to learn the " +
                   "model params.")
         else:
-            # Apply one step of E-step to get the sample log-likelihoods
-            return self._e_step(X, self.params)[1] / self.data_dim
+            X = np.asarray(X, dtype=self.dtype)
+            return self._score_samples(X) / self.data_dim
 
-    def score(self, X):
+    def score(self, X, sample_weight=None):
         """Compute the average log-likelihood of data matrix X
 
         Parameters
@@ -365,6 +2139,9 @@ class BaseModel(object):
         X: array, shape (n_samples, n_features)
             The data
 
+        sample_weight: array, shape (n_samples,), optional
+            Weight of each sample in the average
+
         Returns
         -------
         meanLl: array, shape (n_samples,)
@@ -378,7 +2155,76 @@ class BaseModel(object):
             sample_ll = self.score_samples(X)
 
             # Divide by number of examples to get average log likelihood
-            return sample_ll.mean()
+            return np.average(sample_ll, weights=sample_weight)
+
+    def _total_log_likelihood(self, X=None, sample_weight=None):
+        """ Total log-likelihood of X, or of the training data if X is None.
+
+        Returns the log-likelihood and the number of examples, or their
+        weighted sum and the total weight with sample_weight.
+        """
+        if X is None:
+            log_lik = self.trainNll * self.n_examples * self.data_dim
+            return log_lik, self.n_examples
+        observed = ~np.isnan(X).all(axis=1)
+        sample_ll = self.score_samples(X[observed])
+        if sample_weight is None:
+            return sample_ll.sum() * self.data_dim, sample_ll.shape[0]
+        sample_weight = np.asarray(sample_weight, dtype=float)[observed]
+        return (sample_ll @ sample_weight) * self.data_dim, sample_weight.sum()
+
+    def bic(self, X=None, sample_weight=None):
+        """Bayesian information criterion for the data X.
+
+        Lower values are better. If X is None, the training log-likelihood
+        from the final EM iteration is used, so no pass over the data is
+        needed.
+
+        Parameters
+        ----------
+        X: array, shape (n_samples, n_features), optional
+            The data
+
+        sample_weight: array, shape (n_samples,), optional
+            Weight of each sample of X. The total weight is used as the
+            number of samples.
+
+        Returns
+        -------
+        bic: float
+        """
+        if not self.isFitted:
+            print("Model is not yet fitted. First use fit to learn the " +
+                  "model params.")
+        else:
+            log_lik, n_examples = self._total_log_likelihood(X,
+                                                             sample_weight)
+            return -2*log_lik + self._n_parameters()*np.log(n_examples)
+
+    def aic(self, X=None, sample_weight=None):
+        """Akaike information criterion for the data X.
+
+        Lower values are better. If X is None, the training log-likelihood
+        from the final EM iteration is used.
+
+        Parameters
+        ----------
+        X: array, shape (n_samples, n_features), optional
+            The data
+
+        sample_weight: array, shape (n_samples,), optional
+            Weight of each sample of X
+
+        Returns
+        -------
+        aic: float
+        """
+        if not self.isFitted:
+            print("Model is not yet fitted. First use fit to learn the " +
+                  "model params.")
+        else:
+            log_lik, _ = self._total_log_likelihood(X, sample_weight)
+            return -2*log_lik + 2*self._n_parameters()
 
 
 class GMM(BaseModel):
@@ -409,7 +2255,8 @@ class GMM(BaseModel):
         Maximum number of iterations for EM algorithm.
 
     random_state : int or RandomState
-        Pseudo number generator state used for random sampling.
+        Pseudo number generator state used for random sampling. Also seeds
+        the initialisations in fit.
 
     verbose : bool
         Print output during fitting if true.
@@ -421,6 +2268,21 @@ class GMM(BaseModel):
     SMALL : float
         The small number used to improve the condition of covariance matrices.
 
+    working_memory : float
+        Approximate size in MiB of the temporary arrays used in the E-step.
+        Examples are processed in chunks that fit within this budget, so
+        peak memory does not grow with the number of examples.
+
+    dtype : numpy dtype
+        Floating point type of the data, responsibilities and other per-
+        example work. Sufficient statistics are accumulated, and parameters
+        factorized and updated, in float64 whatever the dtype. With
+        np.float32, memory for the data halves and matrix products run
+        about twice as fast; for data with features of unit scale, the
+        fitted mean log-likelihood per dimension agrees with the float64
+        fit to within about 1e-4. Pass float32 data to avoid converting it
+        on every pass.
+
     Attributes
     ----------
 
@@ -448,7 +2310,7 @@ class GMM(BaseModel):
         Mean training log-likelihood per dimension. Set after model is fitted.
     """
 
-    def _e_step_no_miss(self, X, params):
+    def _e_step_no_miss(self, X, params, factors=None, sample_weight=None):
         """ E-Step of the EM-algorithm for complete data.
 
         The E-step takes the existing parameters, for the components, bias
@@ -493,37 +2355,42 @@ class GMM(BaseModel):
         sample_ll : array, [nExamples, ]
             log-likelihood for each example under the current parameters.
         """
-        # Get params
-        mu_list = params['mu_list']
-        components = params['components']
-
-        # Get Sigma from params
-        Sigma_list = self._params_to_Sigma(params)
-
-        # Compute responsibilities
-        log_r_sum, responsibilities = (
-            self._get_log_responsibilities(X, mu_list, Sigma_list, components)
-            )
+        if factors is None:
+            factors = self._get_factors(params)
+        n_examples, data_dim = X.shape
+        ss = self._get_ss(X[:0], np.zeros([0, self.n_components],
+                                          dtype=self.dtype), params)
+        sample_ll = np.empty(n_examples)
 
-        # Get sufficient statistics
-        x_list = [np.sum(X*r[:, np.newaxis], axis=0) for r in
-                  responsibilities.T]
-        xx_list = [np.sum(X[:, :, np.newaxis] * X[:, np.newaxis, :] *
-                          r[:, np.newaxis, np.newaxis], axis=0) for r in
-                   responsibilities.T]
-        r_list = [r.sum() for r in responsibilities.T]
+        # Accumulate the statistics over chunks of examples
+        row_bytes = 16 * self.n_components * data_dim
+        for batch in self._gen_batches(n_examples, row_bytes):
+            X_batch = X[batch]
 
-        # Store sufficient statistics in dictionary
-        ss = {'r_list': r_list,
-              'x_list': x_list,
-              'xx_list': xx_list}
+            # Compute responsibilities
+            sample_ll[batch], responsibilities = (
+                self._get_log_responsibilities(X_batch, factors)
+                )
 
-        # Compute log-likelihood of each example
-        sample_ll = log_r_sum
+            # Get sufficient statistics
+            responsibilities = _weight_rows(responsibilities, sample_weight,
+                                            batch)
+            ss = _add_ss(ss, self._get_ss(X_batch, responsibilities, params))
 
         return ss, sample_ll
 
-    def _e_step_miss(self, X, params):
+    def _get_ss(self, X, r, params):
+        """ Sufficient statistics ss['r_list'], ss['x_list'] and
+        ss['xx_list'] of complete data. The weighted Gram matrices
+        X^T diag(r) X are formed without any [nExamples, dataDim, dataDim]
+        array.
+        """
+        X_weighted = r.T[:, :, np.newaxis] * X
+        return _ss_to_float({'r_list': r.sum(axis=0),
+                             'x_list': r.T @ X,
+                             'xx_list': X_weighted.transpose(0, 2, 1) @ X})
+
+    def _e_step_miss(self, X, params, sample_weight=None):
         """ E-Step of the EM-algorithm for missing data.
 
         The E-step takes the existing parameters, for the components, bias
@@ -570,80 +2437,71 @@ class GMM(BaseModel):
         """
         # Get current params
         mu_list = params['mu_list']
-        components = params['components']
 
         # Get Sigma from params
         Sigma_list = self._params_to_Sigma(params)
 
-        observed_list = [np.array(np.where(~np.isnan(row))).flatten() for
-                         row in X]
-        n_examples, data_dim = np.shape(X)
+        data_dim = np.shape(X)[1]
+        patterns = self._get_missing_patterns(X)
 
         # Compute responsibilities
         log_r_sum, responsibilities = (
-            self._get_log_responsibilities_miss(X, mu_list, Sigma_list,
-                                                components, observed_list)
+            self._get_log_responsibilities_miss(X, params, patterns)
             )
-
-        # Get sufficient statistics
-        r_list = [r.sum() for r in responsibilities.T]
-        x_list = []
-        xx_list = []
-        for k, mu, Sigma, r in zip(range(self.n_components), mu_list,
-                                   Sigma_list, responsibilities.T):
-
-            x_tot = np.zeros(data_dim)
-            xx_tot = np.zeros([data_dim, data_dim])
-            for n in range(n_examples):
-                id_obs = observed_list[n]
-                id_miss = np.setdiff1d(np.arange(data_dim), id_obs)
-                n_miss = len(id_miss)
-                row = X[n, :]
-                row_obs = row[id_obs]
-
-                # Simplify for case with no missing data
-                if n_miss == 0:
-                    x_tot += row_obs * r[n]
-                    xx_tot += np.outer(row_obs, row_obs) * r[n]
+        responsibilities = _weight_rows(responsibilities, sample_weight)
+
+        # Get sufficient statistics, one block of examples per pattern of
+        # missing values
+        r_list = responsibilities.sum(axis=0)
+        x_list = np.zeros([self.n_components, data_dim])
+        xx_list = np.zeros([self.n_components, data_dim, data_dim])
+        id_comp = np.arange(self.n_components)
+        row_bytes = 16 * self.n_components * data_dim
+        for id_obs, id_miss, rows in patterns:
+            id_oo = np.ix_(id_comp, id_obs, id_obs)
+            id_om = np.ix_(id_comp, id_obs, id_miss)
+            id_mo = np.ix_(id_comp, id_miss, id_obs)
+            id_mm = np.ix_(id_comp, id_miss, id_miss)
+
+            # Get conditional distribution p(x_miss | x_obs, params_k) for
+            # all components, once per pattern
+            if id_miss.size > 0:
+                mu_obs = mu_list[:, id_obs]
+                mu_miss = mu_list[:, id_miss]
+                Sigma_obs_inv = np.linalg.pinv(Sigma_list[id_oo])
+                Sigma_miss_obs = Sigma_list[id_mo]
+                B = Sigma_miss_obs @ Sigma_obs_inv
+                Sigma_cond = (Sigma_list[id_mm] -
+                              B @ Sigma_miss_obs.transpose(0, 2, 1))
+                mu_cond = mu_miss - np.einsum('kmo,ko->km', B, mu_obs)
+                B = np.asarray(B, dtype=self.dtype)
+                mu_cond = np.asarray(mu_cond, dtype=self.dtype)
+
+            for batch in self._gen_batches(rows.size, row_bytes):
+                rows_batch = rows[batch]
+                X_obs = X[np.ix_(rows_batch, id_obs)]
+                r = responsibilities[rows_batch]
+
+                # Observed dimensions
+                X_weighted = r.T[:, :, np.newaxis] * X_obs
+                x_list[:, id_obs] += r.T @ X_obs
+                xx_list[id_oo] += X_weighted.transpose(0, 2, 1) @ X_obs
+                if id_miss.size == 0:
                     continue
 
-                # Get missing / present parameters
-                mu_obs = mu[id_obs]
-                mu_miss = mu[id_miss]
-                Sigma_obs = Sigma[np.ix_(id_obs, id_obs)]
-                Sigma_miss = Sigma[np.ix_(id_miss, id_miss)]
-                Sigma_obs_miss = Sigma[np.ix_(id_obs, id_miss)]
-                Sigma_miss_obs = Sigma[np.ix_(id_miss, id_obs)]
-
-                # Get conditional distribution p(x_miss | x_vis, params_k)
-                Sigma_obs_inv = np.linalg.pinv(Sigma_obs)
-                mean_cond = (
-                    mu_miss +
-                    Sigma_miss_obs @ Sigma_obs_inv @ (row_obs - mu_obs)
-                    )
-                Sigma_cond = (
-                    Sigma_miss -
-                    Sigma_miss_obs @ Sigma_obs_inv @ Sigma_obs_miss
+                # Missing dimensions: E[x_miss] and E[x_miss x_miss^T]
+                mean_cond = (X_obs @ B.transpose(0, 2, 1) +
+                             mu_cond[:, np.newaxis, :])
+                mean_weighted = r.T[:, :, np.newaxis] * mean_cond
+                x_list[:, id_miss] += mean_weighted.sum(axis=1)
+                xx_om = X_obs.T @ mean_weighted
+                xx_list[id_om] += xx_om
+                xx_list[id_mo] += xx_om.transpose(0, 2, 1)
+                xx_list[id_mm] += (
+                    mean_weighted.transpose(0, 2, 1) @ mean_cond +
+                    r.sum(axis=0)[:, np.newaxis, np.newaxis] * Sigma_cond
                     )
 
-                # Get sufficient statistics E[x]
-                x = np.empty(data_dim)
-                x[id_obs] = row_obs
-                x[id_miss] = mean_cond
-                x_tot += x * r[n]
-
-                # Get sufficient statistic E[xx^t]
-                xx = np.empty([data_dim, data_dim])
-                xx[np.ix_(id_obs, id_obs)] = np.outer(row_obs, row_obs)
-                xx[np.ix_(id_obs, id_miss)] = np.outer(row_obs, mean_cond)
-                xx[np.ix_(id_miss, id_obs)] = np.outer(mean_cond, row_obs)
-                xx[np.ix_(id_miss, id_miss)] = (
-                    np.outer(mean_cond, mean_cond) + Sigma_cond
-                    )
-                xx_tot += xx * r[n]
-            x_list.append(x_tot)
-            xx_list.append(xx_tot)
-
         # Store sufficient statistics in dictionary
         ss = {'r_list': r_list,
               'x_list': x_list,
@@ -696,19 +2554,15 @@ class GMM(BaseModel):
         r_list = ss['r_list']
         x_list = ss['x_list']
         xx_list = ss['xx_list']
-        n_examples = self.n_examples
 
-        # Update components param
-        components = np.array([r/n_examples for r in r_list])
+        # Update components param. The statistics may be averaged over a
+        # stream of batches, so normalise by the total responsibility.
+        components = r_list / r_list.sum()
 
         # Update mean / Sigma params
-        mu_list = []
-        Sigma_list = []
-        for r, x, xx in zip(r_list, x_list, xx_list):
-            mu = x / r
-            mu_list.append(mu)
-            Sigma = xx / r - np.outer(mu, mu)
-            Sigma_list.append(Sigma)
+        mu_list = x_list / r_list[:, np.newaxis]
+        Sigma_list = (xx_list / r_list[:, np.newaxis, np.newaxis] -
+                      mu_list[:, :, np.newaxis] * mu_list[:, np.newaxis, :])
 
         # Store params in dictionary
         params = {'Sigma_list': Sigma_list,
@@ -721,26 +2575,48 @@ class GMM(BaseModel):
         """ Converts parameter dictionary to covariance matrix list"""
         return params['Sigma_list']
 
-    def _init_params(self, X, init_method='kmeans'):
-        seed(self.random_state)
+    def _n_parameters(self):
+        """ Number of free parameters of the model"""
+        cov_params = self.data_dim * (self.data_dim + 1) // 2
+        return (self.n_components * (self.data_dim + cov_params) +
+                self.n_components - 1)
+
+    def _marginal_params(self, params, id_obs):
+        """ Parameters of the marginal distribution over dimensions id_obs"""
+        Sigma_list = params['Sigma_list']
+        return {'mu_list': params['mu_list'][:, id_obs],
+                'Sigma_list': Sigma_list[:, id_obs][:, :, id_obs],
+                'components': params['components']}
+
+    def _init_kmeans(self, X, random_state=None):
+        """ Cluster X with KMeans, imputing any missing values.
+
+        Returns the (imputed) data and the fitted KMeans object.
+        """
+        kmeans = KMeans(self.n_components,
+                        random_state=check_random_state(random_state))
+        if self.missing_data:
+            imputer = SimpleImputer()
+            X = imputer.fit_transform(X)
+        kmeans.fit(X)
+        return X, kmeans
+
+    def _init_params(self, X, init_method='kmeans', random_state=None):
         n_examples = X.shape[0]
         if init_method == 'kmeans':
-            kmeans = KMeans(self.n_components)
-            if self.missing_data:
-                imputer = Imputer()
-                X = imputer.fit_transform(X)
-            kmeans.fit(X)
-            mu_list = [k for k in kmeans.cluster_centers_]
-            Sigma_list = []
+            X, kmeans = self._init_kmeans(X, random_state)
+            mu_list = kmeans.cluster_centers_
+            Sigma_list = np.empty([self.n_components, self.data_dim,
+                                   self.data_dim])
             for k in range(self.n_components):
                 X_k = X[kmeans.labels_ == k, :]
                 n_k = X_k.shape[0]
                 if n_k == 1:
-                    Sigma_list.append(0.1*np.eye(self.data_dim))
+                    Sigma_list[k] = 0.1*np.eye(self.data_dim)
                 else:
-                    Sigma_list.append(np.cov(X_k.T))
-            components = np.array([np.sum(kmeans.labels_ == k) / n_examples
-                                  for k in range(self.n_components)])
+                    Sigma_list[k] = np.cov(X_k.T)
+            components = np.bincount(kmeans.labels_,
+                                     minlength=self.n_components) / n_examples
             params_init = {'mu_list': mu_list,
                            'Sigma_list': Sigma_list,
                            'components': components}
@@ -748,41 +2624,370 @@ class GMM(BaseModel):
 
 
 class SphericalGMM(GMM):
+    """Gaussian Mixture Model with spherical covariances.
+
+    Each component has covariance sigma_sq * I, stored in
+    params['sigma_sq_list'] with shape [n_components, ]. The E- and M-steps
+    only handle per-component variances: log-densities are formed from
+    squared norms and one matrix product with the means, and the second
+    moments are sums of squared norms, so memory is O(n_components *
+    data_dim).
+    """
 
-    @staticmethod
-    def _convert_gmm_params(params):
-        sigma_sq_list = [np.mean(np.diag(cov)) for cov in
-                         params['Sigma_list']]
-        params_conv = {i: params[i] for i in params if i != 'Sigma_list'}
-        params_conv['sigma_sq_list'] = sigma_sq_list
-        return params_conv
-
-    def _init_params(self, X, init_method='kmeans'):
-        params_init_gmm = (
-            super(SphericalGMM, self)._init_params(X, init_method)
-            )
-        return self._convert_gmm_params(params_init_gmm)
+    def _params_from_variances(self, mu_list, var_list, components):
+        """ Parameters from per-dimension variances [n_components, data_dim]"""
+        return {'mu_list': mu_list,
+                'sigma_sq_list': var_list.mean(axis=1),
+                'components': components}
+
+    def _init_params(self, X, init_method='kmeans', random_state=None):
+        n_examples = X.shape[0]
+        if init_method == 'kmeans':
+            X, kmeans = self._init_kmeans(X, random_state)
+            var_list = np.empty([self.n_components, self.data_dim])
+            for k in range(self.n_components):
+                X_k = X[kmeans.labels_ == k, :]
+                if X_k.shape[0] == 1:
+                    var_list[k] = 0.1
+                else:
+                    var_list[k] = np.var(X_k, axis=0, ddof=1)
+            components = np.bincount(kmeans.labels_,
+                                     minlength=self.n_components) / n_examples
+            return self._params_from_variances(kmeans.cluster_centers_,
+                                               var_list, components)
+
+    def _get_factors(self, params):
+        """ Factorize sigma_sq * I without forming it"""
+        mu_list = params['mu_list']
+        sigma_sq_list = params['sigma_sq_list']
+        if self.robust:
+            sigma_sq_list = sigma_sq_list + self.SMALL
+        if np.any(sigma_sq_list <= 0):
+            raise np.linalg.LinAlgError(self.error_msg)
+        factors = {'mu_list': mu_list,
+                   'mu_sq_list': np.sum(mu_list**2, axis=1),
+                   'prec_list': 1 / sigma_sq_list,
+                   'log_det_list': mu_list.shape[1]*np.log(sigma_sq_list),
+                   'log_components': np.log(params['components'])}
+        return self._to_dtype(factors)
+
+    def _get_spherical_log_prob(self, X, x_sq, factors):
+        """ Get log p(x, k) given the squared norms x_sq of the examples"""
+        maha = ((x_sq[:, np.newaxis] - 2 * X @ factors['mu_list'].T +
+                 factors['mu_sq_list']) * factors['prec_list'])
+        log_prob = -0.5*(X.shape[1]*_LOG_2PI +
+                         factors['log_det_list'] + maha)
+        return log_prob + factors['log_components']
+
+    def _get_log_prob(self, X, factors):
+        return self._get_spherical_log_prob(X, np.einsum('nd,nd->n', X, X),
+                                            factors)
+
+    def _get_masked_log_prob(self, X_obs, observed, factors):
+        """ Get log p(x_obs, k) from the zero-filled data and the observed
+        mask.
+
+        The missing dimensions are independent of the observed ones, so the
+        log-density is the spherical one restricted to the observed
+        dimensions.
+        """
+        mu_row = factors['mu_list']
+        x_sq = np.einsum('nd,nd->n', X_obs, X_obs)
+        maha = ((x_sq[:, np.newaxis] - 2 * X_obs @ mu_row.T +
+                 observed @ mu_row.T**2) * factors['prec_list'])
+        n_obs = observed.sum(axis=1)[:, np.newaxis]
+        log_norm = _LOG_2PI - np.log(factors['prec_list'])
+        return -0.5*(n_obs*log_norm + maha) + factors['log_components']
+
+    def _get_log_prob_observed(self, X, missing, params, factors):
+        return self._get_masked_log_prob(np.where(missing, 0., X),
+                                         (~missing).astype(self.dtype),
+                                         factors)
+
+    def _e_step_no_miss(self, X, params, factors=None, sample_weight=None):
+        """ E-Step of the EM-algorithm for complete data.
+
+        Returns sufficient statistics ss['r_list'], ss['x_list'] and
+        ss['xx_list'], where ss['xx_list'] holds the sums of squared norms
+        of the data vectors weighted by component responsibilities,
+        [n_components, ]. The squared norms are computed once per example
+        and shared with the log-densities.
+        """
+        if factors is None:
+            factors = self._get_factors(params)
+        n_examples, data_dim = X.shape
+        r_list = np.zeros(self.n_components)
+        x_list = np.zeros([self.n_components, data_dim])
+        xx_list = np.zeros(self.n_components)
+        sample_ll = np.empty(n_examples)
+        row_bytes = 32 * self.n_components + 8
+        for batch in self._gen_batches(n_examples, row_bytes):
+            X_batch = X[batch]
+            x_sq = np.einsum('nd,nd->n', X_batch, X_batch)
+
+            # Compute responsibilities
+            log_r = self._get_spherical_log_prob(X_batch, x_sq, factors)
+            sample_ll[batch] = logsumexp(log_r, axis=1)
+            r = _weight_rows(np.exp(log_r - sample_ll[batch][:, np.newaxis]),
+                             sample_weight, batch)
+
+            # Get sufficient statistics
+            r_list += r.sum(axis=0)
+            x_list += r.T @ X_batch
+            xx_list += r.T @ x_sq
+
+        ss = {'r_list': r_list,
+              'x_list': x_list,
+              'xx_list': xx_list}
+        return ss, sample_ll
+
+    def _get_ss(self, X, r, params):
+        x_sq = np.einsum('nd,nd->n', X, X)
+        return _ss_to_float({'r_list': r.sum(axis=0),
+                             'x_list': r.T @ X,
+                             'xx_list': r.T @ x_sq})
+
+    def _e_step_miss(self, X, params, sample_weight=None):
+        """ E-Step of the EM-algorithm for missing data.
+
+        With spherical covariances the missing dimensions are independent
+        of the observed ones, so the log-density only involves the observed
+        dimensions and the missing values have the prior moments mu_kd and
+        mu_kd^2 + sigma_sq_k. Everything is computed with products of the
+        zero-filled data and the observed mask, without grouping examples by
+        their pattern of missing values.
+        """
+        factors = self._get_factors(params)
+        mu_list = params['mu_list']
+        n_examples, data_dim = X.shape
+        r_list = np.zeros(self.n_components)
+        x_list = np.zeros([self.n_components, data_dim])
+        xx_list = np.zeros(self.n_components)
+        r_miss = np.zeros([self.n_components, data_dim])
+        sample_ll = np.empty(n_examples)
+        row_bytes = 24 * data_dim + 32 * self.n_components
+        for batch in self._gen_batches(n_examples, row_bytes):
+            missing = np.isnan(X[batch])
+            X_obs = np.where(missing, 0., X[batch])
+            observed = (~missing).astype(self.dtype)
+            x_sq = np.einsum('nd,nd->n', X_obs, X_obs)
+
+            # Log-densities of the observed dimensions
+            log_r = self._get_masked_log_prob(X_obs, observed, factors)
+            sample_ll[batch] = logsumexp(log_r, axis=1)
+            r = _weight_rows(np.exp(log_r - sample_ll[batch][:, np.newaxis]),
+                             sample_weight, batch)
+
+            # Statistics of the observed values, and the responsibility
+            # mass of the missing values
+            r_list += r.sum(axis=0)
+            x_list += r.T @ X_obs
+            xx_list += r.T @ x_sq
+            r_miss += r.T @ missing
+
+        # Add the prior moments of the missing values
+        x_list += r_miss * mu_list
+        xx_list += (np.sum(r_miss * mu_list**2, axis=1) +
+                    r_miss.sum(axis=1) * params['sigma_sq_list'])
+
+        ss = {'r_list': r_list,
+              'x_list': x_list,
+              'xx_list': xx_list}
+        return ss, sample_ll
 
     def _m_step(self, ss, params):
-        params_gmm = super(SphericalGMM, self)._m_step(ss, params)
-        return self._convert_gmm_params(params_gmm)
+        """ M-Step of the EM-algorithm.
+
+        Updates the means, spherical variances and component proportions
+        from the sufficient statistics of the E-step.
+        """
+        r_list = ss['r_list']
+        components = r_list / r_list.sum()
+        mu_list = ss['x_list'] / r_list[:, np.newaxis]
+        sigma_sq_list = ((ss['xx_list'] / r_list -
+                          np.sum(mu_list**2, axis=1)) / self.data_dim)
+        return {'mu_list': mu_list,
+                'sigma_sq_list': sigma_sq_list,
+                'components': components}
 
     def _params_to_Sigma(self, params):
-        return [sigma_sq*np.eye(self.data_dim) for sigma_sq in
-                params['sigma_sq_list']]
+        sigma_sq_list = params['sigma_sq_list']
+        data_dim = params['mu_list'].shape[1]
+        return sigma_sq_list[:, np.newaxis, np.newaxis] * np.eye(data_dim)
+
+    def _marginal_params(self, params, id_obs):
+        return {'mu_list': params['mu_list'][:, id_obs],
+                'sigma_sq_list': params['sigma_sq_list'],
+                'components': params['components']}
+
+    def _n_parameters(self):
+        return self.n_components * (self.data_dim + 2) - 1
+
+    def _get_sampling_factors(self, params, noisy=True):
+        std_list = np.sqrt(params['sigma_sq_list'])
+        return {'mu_list': params['mu_list'],
+                'std_list': np.repeat(std_list[:, np.newaxis],
+                                      params['mu_list'].shape[1], axis=1)}
 
 
 class DiagonalGMM(SphericalGMM):
+    """Gaussian Mixture Model with diagonal covariances.
 
-    @staticmethod
-    def _convert_gmm_params(params):
-        Psi_list = [np.diag(np.diag(cov)) for cov in params['Sigma_list']]
-        params_conv = {i: params[i] for i in params if i != 'Sigma_list'}
-        params_conv['Psi_list'] = Psi_list
-        return params_conv
+    Each component has covariance diag(Psi), with the variances stored in
+    params['Psi_list'] with shape [n_components, data_dim]. The E- and
+    M-steps only handle per-dimension variances, so memory is
+    O(n_components * data_dim).
+    """
+
+    def _params_from_variances(self, mu_list, var_list, components):
+        return {'mu_list': mu_list,
+                'Psi_list': var_list,
+                'components': components}
+
+    def _get_factors(self, params):
+        """ Factorize diag(Psi) without forming it"""
+        return self._get_diagonal_factors(params['mu_list'],
+                                          params['Psi_list'],
+                                          params['components'])
+
+    def _get_log_prob(self, X, factors):
+        return self._get_diagonal_log_prob(X, factors)
+
+    def _get_box_maha_bounds(self, lo, hi, params):
+        """ Exact bounds, as the distance is a sum over dimensions"""
+        var_list = params['Psi_list']
+        if self.robust:
+            var_list = var_list + self.SMALL
+        dist_min, dist_max = _box_distances(lo, hi, params['mu_list'])
+        return (np.einsum('bkd,kd->bk', dist_min**2, 1 / var_list),
+                np.einsum('bkd,kd->bk', dist_max**2, 1 / var_list))
+
+    def _get_masked_log_prob(self, X_obs, observed, factors):
+        """ Get log p(x_obs, k) from the zero-filled data and the observed
+        mask.
+
+        The log-density factorises over dimensions, so its per-dimension
+        terms are weighted by the squared values, the values and the
+        observed mask, and one matrix product gives all log-densities.
+        """
+        mu_list = factors['mu_list']
+        prec_list = factors['prec_list']
+        weights = np.hstack([prec_list, -2 * mu_list * prec_list,
+                             mu_list**2 * prec_list - np.log(prec_list) +
+                             _LOG_2PI])
+        return (-0.5 * np.hstack([X_obs**2, X_obs, observed]) @ weights.T +
+                factors['log_components'])
+
+    def _e_step_no_miss(self, X, params, factors=None, sample_weight=None):
+        """ E-Step of the EM-algorithm for complete data.
+
+        Returns sufficient statistics ss['r_list'], ss['x_list'] and
+        ss['xx_diag_list'], where ss['xx_diag_list'] holds the sums of
+        squared data values weighted by component responsibilities,
+        [n_components, data_dim].
+        """
+        if factors is None:
+            factors = self._get_factors(params)
+        n_examples, data_dim = X.shape
+        ss = self._get_ss(X[:0], np.zeros([0, self.n_components],
+                                          dtype=self.dtype), params)
+        sample_ll = np.empty(n_examples)
+        row_bytes = 8 * data_dim + 32 * self.n_components
+        for batch in self._gen_batches(n_examples, row_bytes):
+            X_batch = X[batch]
+
+            # Compute responsibilities
+            sample_ll[batch], r = (
+                self._get_log_responsibilities(X_batch, factors)
+                )
+            r = _weight_rows(r, sample_weight, batch)
+
+            # Get sufficient statistics
+            ss = _add_ss(ss, self._get_ss(X_batch, r, params))
+
+        return ss, sample_ll
+
+    def _get_ss(self, X, r, params):
+        return _ss_to_float({'r_list': r.sum(axis=0),
+                             'x_list': r.T @ X,
+                             'xx_diag_list': r.T @ X**2})
+
+    def _e_step_miss(self, X, params, sample_weight=None):
+        """ E-Step of the EM-algorithm for missing data.
+
+        With diagonal covariances the log-density factorises over
+        dimensions, so it is a sum over the observed dimensions, and the
+        missing values have the prior moments mu_kd and mu_kd^2 + Psi_kd.
+        Everything is computed with products of the zero-filled data and
+        the observed mask, without grouping examples by their pattern of
+        missing values.
+        """
+        factors = self._get_factors(params)
+        mu_list = params['mu_list']
+        n_examples, data_dim = X.shape
+        r_list = np.zeros(self.n_components)
+        x_list = np.zeros([self.n_components, data_dim])
+        xx_diag_list = np.zeros([self.n_components, data_dim])
+        r_miss = np.zeros([self.n_components, data_dim])
+        sample_ll = np.empty(n_examples)
+        row_bytes = 64 * data_dim + 32 * self.n_components
+        for batch in self._gen_batches(n_examples, row_bytes):
+            missing = np.isnan(X[batch])
+            X_obs = np.where(missing, 0., X[batch])
+            X_obs_sq = X_obs**2
+
+            # Log-densities of the observed dimensions
+            observed = (~missing).astype(self.dtype)
+            log_r = self._get_masked_log_prob(X_obs, observed, factors)
+            sample_ll[batch] = logsumexp(log_r, axis=1)
+            r = _weight_rows(np.exp(log_r - sample_ll[batch][:, np.newaxis]),
+                             sample_weight, batch)
+
+            # Statistics of the observed values, and the responsibility
+            # mass of the missing values
+            r_list += r.sum(axis=0)
+            x_list += r.T @ X_obs
+            xx_diag_list += r.T @ X_obs_sq
+            r_miss += r.T @ missing
+
+        # Add the prior moments of the missing values
+        x_list += r_miss * mu_list
+        xx_diag_list += r_miss * (mu_list**2 + params['Psi_list'])
+
+        ss = {'r_list': r_list,
+              'x_list': x_list,
+              'xx_diag_list': xx_diag_list}
+        return ss, sample_ll
+
+    def _m_step(self, ss, params):
+        """ M-Step of the EM-algorithm.
+
+        Updates the means, per-dimension variances and component
+        proportions from the sufficient statistics of the E-step.
+        """
+        r_list = ss['r_list']
+        components = r_list / r_list.sum()
+        mu_list = ss['x_list'] / r_list[:, np.newaxis]
+        Psi_list = ss['xx_diag_list'] / r_list[:, np.newaxis] - mu_list**2
+        return {'mu_list': mu_list,
+                'Psi_list': Psi_list,
+                'components': components}
 
     def _params_to_Sigma(self, params):
-            return params['Psi_list']
+        Psi_list = params['Psi_list']
+        return Psi_list[:, :, np.newaxis] * np.eye(Psi_list.shape[1])
+
+    def _marginal_params(self, params, id_obs):
+        return {'mu_list': params['mu_list'][:, id_obs],
+                'Psi_list': params['Psi_list'][:, id_obs],
+                'components': params['components']}
+
+    def _n_parameters(self):
+        return self.n_components * (2*self.data_dim + 1) - 1
+
+    def _get_sampling_factors(self, params, noisy=True):
+        return {'mu_list': params['mu_list'],
+                'std_list': np.sqrt(params['Psi_list'])}
 
 
 class MPPCA(GMM):
@@ -848,50 +3053,51 @@ class MPPCA(GMM):
     """
 
     def __init__(self, n_components, latent_dim, tol=1e-3, max_iter=1000,
-                 random_state=0, verbose=True, robust=False, SMALL=1e-5):
+                 random_state=0, verbose=True, robust=False, SMALL=1e-5,
+                 working_memory=128, dtype=np.float64):
 
         super(MPPCA, self).__init__(
             n_components=n_components, tol=tol, max_iter=max_iter,
             random_state=random_state, verbose=verbose, robust=robust,
-            SMALL=SMALL
+            SMALL=SMALL, working_memory=working_memory, dtype=dtype
             )
         self.latent_dim = latent_dim
 
-    def _init_params(self, X, init_method='kmeans'):
-        seed(self.random_state)
+    def _init_params(self, X, init_method='kmeans', random_state=None):
+        rng = check_random_state(random_state)
         n_examples = X.shape[0]
         if init_method == 'kmeans':
-            kmeans = KMeans(self.n_components)
+            kmeans = KMeans(self.n_components, random_state=rng)
             if self.missing_data:
-                imputer = Imputer()
+                imputer = SimpleImputer()
                 X = imputer.fit_transform(X)
             kmeans.fit(X)
             n_clust_list = [(kmeans.labels_ == i).sum() for i in
                             range(self.n_components)]
-            print(n_clust_list)
             mu_list = [k for k in kmeans.cluster_centers_]
             W_list = []
             sigma_sq_list = []
             for k, n_clust in enumerate(n_clust_list):
                 if n_clust >= self.latent_dim:
                     data_k = X[kmeans.labels_ == k, :]
-                    pca = PCA(n_components=self.latent_dim)
+                    pca = PCA(n_components=self.latent_dim,
+                              random_state=rng)
                     pca.fit(data_k)
                     W_list.append(pca.components_.T)
                 else:
-                    W_list.append(np.random.randn(self.data_dim,
-                                                  self.latent_dim))
+                    W_list.append(rng.randn(self.data_dim,
+                                            self.latent_dim))
                 sigma_sq_list.append(0.1)
 #                sigma_sq_list.append(pca.noise_variance_)
             components = np.array([np.sum(kmeans.labels_ == k) / n_examples
                                    for k in range(self.n_components)])
-            params_init = {'mu_list': mu_list,
-                           'W_list': W_list,
-                           'sigma_sq_list': sigma_sq_list,
+            params_init = {'mu_list': np.array(mu_list),
+                           'W_list': np.array(W_list),
+                           'sigma_sq_list': np.array(sigma_sq_list),
                            'components': components}
             return params_init
 
-    def _e_step_no_miss(self, X, params):
+    def _e_step_no_miss(self, X, params, factors=None, sample_weight=None):
         """ E-Step of the EM-algorithm.
 
         The E-step takes the existing parameters, for the components, bias
@@ -920,49 +3126,65 @@ class MPPCA(GMM):
 
         ll :
         """
-        # Get params
-        mu_list = params['mu_list']
-        components = params['components']
-        W_list = params['W_list']
-        sigma_sq_list = params['sigma_sq_list']
         n_examples, data_dim = X.shape
+        if factors is None:
+            factors = self._get_factors(params)
+        ss = self._get_ss(X[:0], np.zeros([0, self.n_components],
+                                          dtype=self.dtype), params)
+        sample_ll = np.empty(n_examples)
+        row_bytes = (32 * self.n_components * (self.latent_dim + 1) +
+                     16 * data_dim)
+        for batch in self._gen_batches(n_examples, row_bytes):
+            X_batch = X[batch]
+
+            # Compute responsibilities
+            sample_ll[batch], r = (
+                self._get_log_responsibilities(X_batch, factors)
+                )
+            r = _weight_rows(r, sample_weight, batch)
+            ss = _add_ss(ss, self._get_ss(X_batch, r, params))
 
-        # Get Sigma from params
-        Sigma_list = self._params_to_Sigma(params)
-
-        # Compute responsibilities
-        log_r_sum, responsibilities = (
-            self._get_log_responsibilities(X, mu_list, Sigma_list, components)
-            )
-
-        # Get sufficient statistics for each component
-        r_list = [r.sum() for r in responsibilities.T]
-        x_list = []
-        z_list = []
-        zz_list = []
-        xz_list = []
-        ss_list = []
-        for mu, W, sigma_sq, r in zip(mu_list, W_list, sigma_sq_list,
-                                      responsibilities.T):
-            dev = X - mu
-            F_inv = np.linalg.inv(W.T @ W + sigma_sq*np.eye(self.latent_dim))
-
-            x_list.append(np.sum(X*r[:, np.newaxis], axis=0))
-
-            z = dev @ W @ F_inv
-            z_list.append(np.sum(z*r[:, np.newaxis], axis=0))
-
-            zz = sigma_sq*F_inv + z[:, :, np.newaxis] * z[:, np.newaxis, :]
-            zz_list.append(np.sum(zz*r[:, np.newaxis, np.newaxis], axis=0))
-
-            xz = dev[:, :, np.newaxis] * z[:, np.newaxis, :]
-            xz_list.append(np.sum(xz*r[:, np.newaxis, np.newaxis], axis=0))
+        return ss, sample_ll
 
-            xx = dev[:, :, np.newaxis] * dev[:, np.newaxis, :]
-            s1 = np.trace(xx, axis1=1, axis2=2)
-            s2 = -2*np.trace(xz @ W.T, axis1=1, axis2=2)
-            s3 = np.trace(zz * (W.T @ W), axis1=1, axis2=2)
-            ss_list.append(np.sum(r*(s1 + s2 + s3)))
+    def _get_ss(self, X, r, params):
+        """ Sufficient statistics of complete data. Only per-example latent
+        means are formed, never per-example outer products.
+        """
+        mu_list = params['mu_list']
+        W_list = params['W_list']
+        sigma_sq_list = params['sigma_sq_list']
+        if self.robust:
+            sigma_sq_list = sigma_sq_list + self.SMALL
+
+        # Latent posterior: E[z] = (x - mu) W F^-1, Cov[z] = sigma_sq F^-1
+        WtW = W_list.transpose(0, 2, 1) @ W_list
+        F_inv = np.linalg.inv(WtW + sigma_sq_list[:, np.newaxis, np.newaxis] *
+                              np.eye(self.latent_dim))
+        proj_list = W_list @ F_inv
+        mu_proj = np.einsum('kd,kdl->kl', mu_list, proj_list)
+        proj_list = np.asarray(proj_list, dtype=self.dtype)
+        mu_proj = np.asarray(mu_proj, dtype=self.dtype)
+
+        z = X @ proj_list - mu_proj[:, np.newaxis, :]
+        rz = r.T[:, :, np.newaxis] * z
+        r_list = r.sum(axis=0).astype(float)
+        x_list = (r.T @ X).astype(float)
+        xx_list = r.T @ np.sum(X**2, axis=1)
+        z_list = rz.sum(axis=1).astype(float)
+        zz_list = (rz.transpose(0, 2, 1) @ z).astype(float)
+        xz_list = (X.T @ rz).astype(float)
+
+        # Centre the moments on the component means
+        xz_list -= mu_list[:, :, np.newaxis] * z_list[:, np.newaxis, :]
+        zz_list += (r_list*sigma_sq_list)[:, np.newaxis, np.newaxis]*F_inv
+
+        # Expected squared reconstruction error. The per-example traces are
+        # linear in the statistics above, so they are taken after summing.
+        s1 = (xx_list - 2*np.sum(mu_list*x_list, axis=1) +
+              r_list*np.sum(mu_list**2, axis=1))
+        s2 = -2*np.sum(xz_list * W_list, axis=(1, 2))
+        s3 = np.sum(zz_list * WtW, axis=(1, 2))
+        ss_list = s1 + s2 + s3
 
         # Store sufficient statistics in dictionary
         ss = {'r_list': r_list,
@@ -972,12 +3194,9 @@ class MPPCA(GMM):
               'zz_list': zz_list,
               'ss_list': ss_list}
 
-        # Compute log-likelihood
-        sample_ll = log_r_sum
-
-        return ss, sample_ll
+        return _ss_to_float(ss)
 
-    def _e_step_miss(self, X, params):
+    def _e_step_miss(self, X, params, sample_weight=None):
         """ E-Step of the EM-algorithm.
 
         The E-step takes the existing parameters, for the components, bias
@@ -1008,110 +3227,90 @@ class MPPCA(GMM):
         """
         # Get current params
         mu_list = params['mu_list']
-        components = params['components']
         sigma_sq_list = params['sigma_sq_list']
         W_list = params['W_list']
 
-        # Get Sigma from params
-        Sigma_list = self._params_to_Sigma(params)
-
-        observed_list = [
-            np.array(np.where(~np.isnan(row))).flatten() for row in X
-            ]
-        n_examples, data_dim = np.shape(X)
+        data_dim = np.shape(X)[1]
+        patterns = self._get_missing_patterns(X)
 
         # Compute responsibilities
         log_r_sum, responsibilities = (
-            self._get_log_responsibilities_miss(X, mu_list, Sigma_list,
-                                                components, observed_list)
+            self._get_log_responsibilities_miss(X, params, patterns)
             )
-
-        # Get sufficient statistics for each component
-        r_list = [r.sum() for r in responsibilities.T]
-        x_list = []
-        z_list = []
-        zz_list = []
-        xz_list = []
-        ss_list = []
-        for mu, W, sigma_sq, r in zip(mu_list, W_list, sigma_sq_list,
-                                      responsibilities.T):
-            x_tot = np.zeros(data_dim)
-            z_tot = np.zeros(self.latent_dim)
-            zz_tot = np.zeros([self.latent_dim, self.latent_dim])
-            xz_tot = np.zeros([self.data_dim, self.latent_dim])
-            ss_tot = 0
-            for n in range(n_examples):
-                id_obs = observed_list[n]
-                id_miss = np.setdiff1d(np.arange(data_dim), id_obs)
-                n_miss = len(id_miss)
-                row = X[n, :]
-                row_obs = row[id_obs]
-
-                # Get missing and visible points
-                W_obs = W[id_obs, :]
-                W_miss = W[id_miss, :]
-                mu_obs = mu[id_obs]
-                mu_miss = mu[id_miss]
-                row_min_mu = row_obs - mu_obs
-
-                # Get conditional distribution of p(z | x_vis, params)
-                F_inv = np.linalg.inv(W_obs.T @ W_obs +
-                                      sigma_sq*np.eye(self.latent_dim))
-                cov_z_cond = sigma_sq*F_inv
-                mean_z_cond = F_inv @ W_obs.T @ (row_obs - mu_obs)
-
-                # Simplify for case with no missing data
-                if n_miss == 0:
-                    x_tot += row_obs*r[n]
-                    z_tot += mean_z_cond*r[n]
-                    zz = cov_z_cond + np.outer(mean_z_cond, mean_z_cond)
-                    zz_tot += zz*r[n]
-                    xz = np.outer(row_min_mu, mean_z_cond)
-                    xz_tot += xz*r[n]
-                    xx = np.outer(row_min_mu, row_min_mu)
-                    s1 = np.trace(xx)
-                    s2 = -2*np.trace(xz @ W.T)
-                    s3 = np.trace(zz * W.T @ W)
-                    ss_tot += (s1 + s2 + s3)*r[n]
-                    continue
-
-                # Get conditional distribution of p(x_miss | z, params)
-                mean_x_miss = W_miss @ mean_z_cond + mu_miss
-
-                # Append sufficient statistics
-                z_tot += mean_z_cond*r[n]
-                zz = cov_z_cond + np.outer(mean_z_cond, mean_z_cond)
-                zz_tot += zz*r[n]
-
-                x_tot[id_obs] += row_obs*r[n]
-                x_tot[id_miss] += mean_x_miss*r[n]
-
-                xz = np.zeros([self.data_dim, self.latent_dim])
-                xz[id_miss, :] = W_miss @ zz
-                xz[id_obs, :] = np.outer(row_min_mu, mean_z_cond)
-                xz_tot += xz*r[n]
-
-                xx = np.empty([data_dim, data_dim])
-                xx[np.ix_(id_obs, id_obs)] = np.outer(row_min_mu, row_min_mu)
-                xx[np.ix_(id_obs, id_miss)] = (
-                    np.outer(row_min_mu, mean_x_miss - mu_miss)
-                    )
-                xx[np.ix_(id_miss, id_obs)] = (
-                    np.outer(mean_x_miss - mu_miss, row_min_mu)
+        responsibilities = _weight_rows(responsibilities, sample_weight)
+
+        # Get sufficient statistics, one block of examples per pattern of
+        # missing values
+        if self.robust:
+            sigma_sq_list = sigma_sq_list + self.SMALL
+        r_list = responsibilities.sum(axis=0)
+        x_list = np.zeros([self.n_components, data_dim])
+        z_list = np.zeros([self.n_components, self.latent_dim])
+        zz_list = np.zeros([self.n_components, self.latent_dim,
+                            self.latent_dim])
+        xz_list = np.zeros([self.n_components, data_dim, self.latent_dim])
+        s1 = np.zeros(self.n_components)
+        row_bytes = 16 * self.n_components * (data_dim + self.latent_dim)
+        for id_obs, id_miss, rows in patterns:
+            W_obs = W_list[:, id_obs, :]
+            W_miss = W_list[:, id_miss, :]
+            mu_obs = mu_list[:, id_obs]
+            mu_miss = mu_list[:, id_miss]
+
+            # Get conditional distribution of p(z | x_obs, params) for all
+            # components, once per pattern
+            F_inv = np.linalg.inv(
+                W_obs.transpose(0, 2, 1) @ W_obs +
+                sigma_sq_list[:, np.newaxis, np.newaxis] *
+                np.eye(self.latent_dim)
+                )
+            cov_z_cond = sigma_sq_list[:, np.newaxis, np.newaxis] * F_inv
+            proj_list = W_obs @ F_inv
+            mu_proj = np.einsum('ko,kol->kl', mu_obs, proj_list)
+            proj_list = np.asarray(proj_list, dtype=self.dtype)
+            mu_proj = np.asarray(mu_proj, dtype=self.dtype)
+
+            for batch in self._gen_batches(rows.size, row_bytes):
+                rows_batch = rows[batch]
+                X_obs = X[np.ix_(rows_batch, id_obs)]
+                r = responsibilities[rows_batch]
+                r_sum = r.sum(axis=0)
+
+                # Latent statistics
+                mean_z_cond = X_obs @ proj_list - mu_proj[:, np.newaxis, :]
+                rz = r.T[:, :, np.newaxis] * mean_z_cond
+                z_tot = rz.sum(axis=1)
+                zz_tot = (rz.transpose(0, 2, 1) @ mean_z_cond +
+                          r_sum[:, np.newaxis, np.newaxis] * cov_z_cond)
+                z_list += z_tot
+                zz_list += zz_tot
+
+                # Observed dimensions
+                x_obs_tot = r.T @ X_obs
+                x_list[:, id_obs] += x_obs_tot
+                xz_list[:, id_obs, :] += (
+                    X_obs.T @ rz -
+                    mu_obs[:, :, np.newaxis] * z_tot[:, np.newaxis, :]
                     )
-                xx[np.ix_(id_miss, id_miss)] = (
-                    W_miss @ zz @ W_miss.T + sigma_sq*np.eye(n_miss)
+                s1 += (r.T @ np.sum(X_obs**2, axis=1) -
+                       2*np.sum(mu_obs*x_obs_tot, axis=1) +
+                       r_sum*np.sum(mu_obs**2, axis=1))
+
+                # Missing dimensions, from p(x_miss | z, params)
+                W_miss_zz = W_miss @ zz_tot
+                x_list[:, id_miss] += (
+                    np.einsum('kml,kl->km', W_miss, z_tot) +
+                    r_sum[:, np.newaxis] * mu_miss
                     )
-                s1 = np.trace(xx)
-                s2 = -2*np.trace(xz @ W.T)
-                s3 = np.trace(zz * W.T @ W)
-                ss_tot += (s1 + s2 + s3)*r[n]
+                xz_list[:, id_miss, :] += W_miss_zz
+                s1 += (np.sum(W_miss_zz * W_miss, axis=(1, 2)) +
+                       id_miss.size * r_sum * sigma_sq_list)
 
-            x_list.append(x_tot)
-            z_list.append(z_tot)
-            zz_list.append(zz_tot)
-            xz_list.append(xz_tot)
-            ss_list.append(ss_tot)
+        # Expected squared reconstruction error
+        s2 = -2*np.sum(xz_list * W_list, axis=(1, 2))
+        s3 = np.sum(zz_list * (W_list.transpose(0, 2, 1) @ W_list),
+                    axis=(1, 2))
+        ss_list = s1 + s2 + s3
 
         # Store sufficient statistics in dictionary
         ss = {'r_list': r_list,
@@ -1142,7 +3341,6 @@ class MPPCA(GMM):
         params : dict
 
         """
-        n_examples = self.n_examples
         r_list = ss['r_list']
         x_list = ss['x_list']
         z_list = ss['z_list']
@@ -1152,23 +3350,21 @@ class MPPCA(GMM):
         W_list_old = params['W_list']
 
         # Update components param
-        components = np.array([r / n_examples for r in r_list])
+        components = r_list / r_list.sum()
 
         # Update mean / Sigma params
-        mu_list = []
-        W_list = []
-        sigma_sq_list = []
-        for r, W, x, z, zz, xz, ss in zip(r_list, W_list_old, x_list, z_list,
-                                          zz_list, xz_list, ss_list):
-            resid = x - W.dot(z)
-            mu = resid / r
-            mu_list.append(mu)
-
-            W = np.linalg.solve(zz, xz.T).T
-            W_list.append(W)
-
-            sigma_sq = ss / (self.data_dim * r)
-            sigma_sq_list.append(sigma_sq)
+        resid = x_list - np.einsum('kdl,kl->kd', W_list_old, z_list)
+        mu_list = resid / r_list[:, np.newaxis]
+        try:
+            W_list = np.linalg.solve(zz_list, xz_list.transpose(0, 2, 1))
+        except np.linalg.LinAlgError:
+            if self.robust:
+                zz_cond = zz_list + self.SMALL*np.eye(self.latent_dim)
+                W_list = np.linalg.solve(zz_cond, xz_list.transpose(0, 2, 1))
+            else:
+                raise np.linalg.LinAlgError(self.error_msg)
+        W_list = W_list.transpose(0, 2, 1)
+        sigma_sq_list = ss_list / (self.data_dim * r_list)
 
         # Store params in dictionary
         params = {'W_list': W_list,
@@ -1180,63 +3376,102 @@ class MPPCA(GMM):
     def _params_to_Sigma(self, params):
         W_list = params['W_list']
         sigma_sq_list = params['sigma_sq_list']
-        Sigma_list = [W @ W.T + sigma_sq*np.eye(self.data_dim)
-                      for W, sigma_sq in zip(W_list, sigma_sq_list)]
+        Sigma_list = (W_list @ W_list.transpose(0, 2, 1) +
+                      sigma_sq_list[:, np.newaxis, np.newaxis] *
+                      np.eye(self.data_dim))
         return Sigma_list
 
+    def _marginal_params(self, params, id_obs):
+        return {'mu_list': params['mu_list'][:, id_obs],
+                'W_list': params['W_list'][:, id_obs, :],
+                'sigma_sq_list': params['sigma_sq_list'],
+                'components': params['components']}
+
+    def _n_parameters(self):
+        """ Number of free parameters, excluding rotations of W"""
+        W_params = (self.data_dim * self.latent_dim -
+                    self.latent_dim * (self.latent_dim - 1) // 2)
+        return (self.n_components * (self.data_dim + W_params + 1) +
+                self.n_components - 1)
+
+    def _get_sampling_factors(self, params, noisy=True):
+        """ Sample as z W^T + mu + noise, without forming W W^T"""
+        std_list = np.sqrt(params['sigma_sq_list'])
+        return {'mu_list': params['mu_list'],
+                'W_list': params['W_list'],
+                'std_list': np.repeat(std_list[:, np.newaxis],
+                                      params['mu_list'].shape[1], axis=1)}
+
+    def _get_factors(self, params):
+        """ Factorize W W^T + sigma_sq I without forming it"""
+        mu_list = params['mu_list']
+        Psi_list = np.repeat(params['sigma_sq_list'][:, np.newaxis],
+                             mu_list.shape[1], axis=1)
+        return self._get_low_rank_factors(mu_list, params['W_list'], Psi_list,
+                                          params['components'])
+
+    def _get_log_prob(self, X, factors):
+        return self._get_low_rank_log_prob(X, factors)
+
+    def _get_log_prob_observed(self, X, missing, params, factors):
+        return self._get_low_rank_log_prob_observed(X, missing, factors)
+
 
 class MFA(GMM):
 
     def __init__(self, n_components, latent_dim, tol=1e-3, max_iter=1000,
-                 random_state=0, verbose=True, robust=False, SMALL=1e-5):
+                 random_state=0, verbose=True, robust=False, SMALL=1e-5,
+                 working_memory=128, dtype=np.float64):
         super(MFA, self).__init__(n_components=n_components, tol=tol,
                                   max_iter=max_iter,
                                   random_state=random_state,
                                   verbose=verbose, robust=robust,
-                                  SMALL=SMALL)
+                                  SMALL=SMALL, working_memory=working_memory,
+                                  dtype=dtype)
         self.latent_dim = latent_dim
 
-    def _init_params(self, X, init_method='kmeans'):
-        seed(self.random_state)
+    def _init_params(self, X, init_method='kmeans', random_state=None):
+        rng = check_random_state(random_state)
         n_examples = X.shape[0]
         if init_method == 'kmeans':
-            kmeans = KMeans(self.n_components)
+            kmeans = KMeans(self.n_components, random_state=rng)
             if self.missing_data:
-                imputer = Imputer()
+                imputer = SimpleImputer()
                 X = imputer.fit_transform(X)
             kmeans.fit(X)
-            mu_list = [k + 0*np.random.randn(self.data_dim) for k in
+            mu_list = [k + 0*rng.randn(self.data_dim) for k in
                        kmeans.cluster_centers_]
             W_list = []
             Psi_list = []
             for k in range(self.n_components):
                 X_k = X[kmeans.labels_ == k, :]
                 if 1 == X_k.shape[0]:
-                    W_list.append(1e-5 * np.random.randn(self.data_dim,
-                                                         self.latent_dim))
-                    Psi_list.append(0.1*np.eye(self.data_dim))
+                    W_list.append(1e-5 * rng.randn(self.data_dim,
+                                                   self.latent_dim))
+                    Psi_list.append(0.1*np.ones(self.data_dim))
                 elif X_k.shape[0] < self.data_dim:
-                    W_list.append(1e-5 * np.random.randn(self.data_dim,
-                                                         self.latent_dim))
-                    Psi_list.append(np.diag(np.diag(np.cov(X_k.T))))
+                    W_list.append(1e-5 * rng.randn(self.data_dim,
+                                                   self.latent_dim))
+                    Psi_list.append(np.diag(np.cov(X_k.T)))
                 else:
-                    fa = FactorAnalysis(n_components=self.latent_dim)
+                    fa = FactorAnalysis(n_components=self.latent_dim,
+                                        random_state=rng)
                     fa.fit(X_k)
                     W_list.append(fa.components_.T)
-                    Psi_list.append(np.diag(fa.noise_variance_))
+                    Psi_list.append(fa.noise_variance_)
             components = np.array([np.sum(kmeans.labels_ == k) / n_examples
                                    for k in range(self.n_components)])
             if np.min(components)*n_examples == 1:
                 print('Warning: Components initialised with only one data ' +
                       'point. Poor results expected. Consider using fewer ' +
                       'components.')
-            params_init = {'mu_list': mu_list,
-                           'W_list': W_list,
-                           'Psi_list': Psi_list,
+            params_init = {'mu_list': np.array(mu_list),
+                           'W_list': np.array(W_list),
+                           'Psi_list': np.array(Psi_list),
                            'components': components}
             return params_init
 
-    def _e_step_no_miss(self, X, params):
+    def _e_step_no_miss(self, X, params, factors=None, sample_weight=None):
         """ E-Step of the EM-algorithm.
 
         The E-step takes the existing parameters, for the components, bias
@@ -1265,69 +3500,74 @@ class MFA(GMM):
 
         ll :
         """
-        # Get params
+        n_examples, data_dim = X.shape
+        if factors is None:
+            factors = self._get_factors(params)
+        ss = self._get_ss(X[:0], np.zeros([0, self.n_components],
+                                          dtype=self.dtype), params)
+        sample_ll = np.empty(n_examples)
+        row_bytes = (32 * self.n_components * (self.latent_dim + 1) +
+                     16 * data_dim)
+        for batch in self._gen_batches(n_examples, row_bytes):
+            X_batch = X[batch]
+
+            # Compute responsibilities
+            sample_ll[batch], r = (
+                self._get_log_responsibilities(X_batch, factors)
+                )
+            r = _weight_rows(r, sample_weight, batch)
+            ss = _add_ss(ss, self._get_ss(X_batch, r, params))
+
+        return ss, sample_ll
+
+    def _get_ss(self, X, r, params):
+        """ Sufficient statistics of complete data. Only the diagonal of
+        the second moments is needed by the M-step.
+        """
         mu_list = params['mu_list']
-        components = params['components']
         W_list = params['W_list']
         Psi_list = params['Psi_list']
-        n_examples, data_dim = X.shape
 
-        # Get Sigma from params
-        Sigma_list = self._params_to_Sigma(params)
-
-        # Compute responsibilities
-        log_r_sum, responsibilities = (
-            self._get_log_responsibilities(X, mu_list, Sigma_list, components)
-            )
-
-        # Get sufficient statistics E[z] and E[zz^t] for each component
-        r_list = [r.sum() for r in responsibilities.T]
-        x_list = []
-        z_list = []
-        zz_list = []
-        xz_list = []
-        zx_list = []
-        xx_list = []
-        for mu, W, Psi, r in zip(mu_list, W_list, Psi_list,
-                                 responsibilities.T):
-            dev = X - mu
-            F = W @ W.T + Psi
-            try:
-                F_inv_W = np.linalg.solve(F, W)
-            except np.linalg.linalg.LinAlgError:
-                if self.robust:
-                    F_robust = F + self.SMALL*np.eye(self.data_dim)
-                    F_inv_W = np.linalg.solve(F_robust, W)
-                else:
-                    raise np.linalg.linalg.LinAlgError(self.error_msg)
-            x_list.append(np.sum(X*r[:, np.newaxis], axis=0))
-            z = dev @ F_inv_W
-            z_list.append(np.sum(z*r[:, np.newaxis], axis=0))
-            zz = (np.eye(self.latent_dim) - W.T @ F_inv_W +
-                  z[:, :, np.newaxis] * z[:, np.newaxis, :])
-            zz_list.append(np.sum(zz*r[:, np.newaxis, np.newaxis], axis=0))
-            xx = dev[:, :, np.newaxis] * dev[:, np.newaxis, :]
-            xx_list.append(np.sum(xx*r[:, np.newaxis, np.newaxis], axis=0))
-            xz = dev[:, :, np.newaxis] * z[:, np.newaxis, :]
-            xz_list.append(np.sum(xz*r[:, np.newaxis, np.newaxis], axis=0))
-            zx = z[:, :, np.newaxis] * dev[:, np.newaxis, :]
-            zx_list.append(np.sum(zx*r[:, np.newaxis, np.newaxis], axis=0))
+        # Latent posterior from the Woodbury identity: Cov[z] = M^-1 and
+        # E[z] = M^-1 W^T Psi^-1 (x - mu), where M = I + W^T Psi^-1 W
+        if self.robust:
+            Psi_list = Psi_list + self.SMALL
+        A_list = W_list / Psi_list[:, :, np.newaxis]
+        M_inv = np.linalg.inv(W_list.transpose(0, 2, 1) @ A_list +
+                              np.eye(self.latent_dim))
+        proj_list = A_list @ M_inv
+        mu_proj = np.einsum('kd,kdl->kl', mu_list, proj_list)
+        proj_list = np.asarray(proj_list, dtype=self.dtype)
+        mu_proj = np.asarray(mu_proj, dtype=self.dtype)
+
+        z = X @ proj_list - mu_proj[:, np.newaxis, :]
+        rz = r.T[:, :, np.newaxis] * z
+        r_list = r.sum(axis=0).astype(float)
+        x_list = (r.T @ X).astype(float)
+        xx_diag_list = (r.T @ X**2).astype(float)
+        z_list = rz.sum(axis=1).astype(float)
+        zz_list = (rz.transpose(0, 2, 1) @ z).astype(float)
+        xz_list = (X.T @ rz).astype(float)
+
+        # Centre the moments on the component means
+        xx_diag_list += (r_list[:, np.newaxis] * mu_list**2 -
+                         2 * mu_list * x_list)
+        xz_list -= mu_list[:, :, np.newaxis] * z_list[:, np.newaxis, :]
+        zz_list += r_list[:, np.newaxis, np.newaxis] * M_inv
+        zx_list = xz_list.transpose(0, 2, 1)
 
         # Store sufficient statistics in dictionary
         ss = {'r_list': r_list,
               'x_list': x_list,
-              'xx_list': xx_list,
+              'xx_diag_list': xx_diag_list,
               'xz_list': xz_list,
               'zx_list': zx_list,
               'z_list': z_list,
               'zz_list': zz_list}
 
-        # Compute log-likelihood
-        sample_ll = log_r_sum
+        return _ss_to_float(ss)
 
-        return ss, sample_ll
-
-    def _e_step_miss(self, X, params):
+    def _e_step_miss(self, X, params, sample_weight=None):
         """ E-Step of the EM-algorithm.
 
         The E-step takes the existing parameters, for the components, bias
@@ -1358,125 +3598,90 @@ class MFA(GMM):
         """
         # Get current params
         mu_list = params['mu_list']
-        components = params['components']
         Psi_list = params['Psi_list']
         W_list = params['W_list']
 
-        # Get Sigma from params
-        Sigma_list = self._params_to_Sigma(params)
-        observed_list = [np.array(np.where(~np.isnan(row))).flatten() for
-                         row in X]
-        n_examples, data_dim = np.shape(X)
+        data_dim = np.shape(X)[1]
+        patterns = self._get_missing_patterns(X)
 
         # Compute responsibilities
         log_r_sum, responsibilities = (
-            self._get_log_responsibilities_miss(X, mu_list, Sigma_list,
-                                                components, observed_list)
+            self._get_log_responsibilities_miss(X, params, patterns)
             )
-
-        # Get sufficient statistics for each component
-        r_list = [r.sum() for r in responsibilities.T]
-        x_list = []
-        xx_list = []
-        z_list = []
-        zz_list = []
-        xz_list = []
-        zx_list = []
-        for mu, W, Psi, r in zip(mu_list, W_list, Psi_list,
-                                 responsibilities.T):
-            Psi_inv = np.diag(1/np.diag(Psi))
-            x_tot = np.zeros(data_dim)
-            xx_tot = np.zeros([data_dim, data_dim])
-            z_tot = np.zeros([self.latent_dim])
-            zz_tot = np.zeros([self.latent_dim, self.latent_dim])
-            xz_tot = np.zeros([self.data_dim, self.latent_dim])
-            zx_tot = np.zeros([self.latent_dim, self.data_dim])
-
-            for n in range(n_examples):
-                id_obs = observed_list[n]
-                id_miss = np.setdiff1d(np.arange(data_dim), id_obs)
-                n_miss = len(id_miss)
-                row = X[n, :]
-                row_obs = row[id_obs]
-
-                # Get missing and visible parameters
-                Psi_miss = Psi[np.ix_(id_miss, id_miss)]
-                Psi_inv_obs = Psi_inv[np.ix_(id_obs, id_obs)]
-                W_obs = W[id_obs, :]
-                W_miss = W[id_miss, :]
-                mu_obs = mu[id_obs]
-                mu_miss = mu[id_miss]
-                row_min_mu = row_obs - mu_obs
-
-                # Get conditional distribution of p(z | x_vis, params) using
-                # the woodbury identity
-
-                Beta = (
-                    Psi_inv_obs - Psi_inv_obs @ W_obs @
-                    np.linalg.solve(
-                        W_obs.T @ Psi_inv_obs @ W_obs +
-                        np.eye(self.latent_dim),
-                        W_obs.T @ Psi_inv_obs)
+        responsibilities = _weight_rows(responsibilities, sample_weight)
+
+        # Get sufficient statistics, one block of examples per pattern of
+        # missing values
+        if self.robust:
+            Psi_list = Psi_list + self.SMALL
+        r_list = responsibilities.sum(axis=0)
+        x_list = np.zeros([self.n_components, data_dim])
+        xx_diag_list = np.zeros([self.n_components, data_dim])
+        z_list = np.zeros([self.n_components, self.latent_dim])
+        zz_list = np.zeros([self.n_components, self.latent_dim,
+                            self.latent_dim])
+        xz_list = np.zeros([self.n_components, data_dim, self.latent_dim])
+        row_bytes = 16 * self.n_components * (data_dim + self.latent_dim)
+        for id_obs, id_miss, rows in patterns:
+            W_obs = W_list[:, id_obs, :]
+            W_miss = W_list[:, id_miss, :]
+            mu_obs = mu_list[:, id_obs]
+            mu_miss = mu_list[:, id_miss]
+
+            # Get conditional distribution of p(z | x_obs, params) for all
+            # components using the woodbury identity, once per pattern
+            A_obs = W_obs / Psi_list[:, id_obs, np.newaxis]
+            cov_z_cond = np.linalg.inv(W_obs.transpose(0, 2, 1) @ A_obs +
+                                       np.eye(self.latent_dim))
+            proj_list = A_obs @ cov_z_cond
+            mu_proj = np.einsum('ko,kol->kl', mu_obs, proj_list)
+            proj_list = np.asarray(proj_list, dtype=self.dtype)
+            mu_proj = np.asarray(mu_proj, dtype=self.dtype)
+
+            for batch in self._gen_batches(rows.size, row_bytes):
+                rows_batch = rows[batch]
+                X_obs = X[np.ix_(rows_batch, id_obs)]
+                r = responsibilities[rows_batch]
+                r_sum = r.sum(axis=0)
+
+                # Latent statistics
+                mean_z_cond = X_obs @ proj_list - mu_proj[:, np.newaxis, :]
+                rz = r.T[:, :, np.newaxis] * mean_z_cond
+                z_tot = rz.sum(axis=1)
+                zz_tot = (rz.transpose(0, 2, 1) @ mean_z_cond +
+                          r_sum[:, np.newaxis, np.newaxis] * cov_z_cond)
+                z_list += z_tot
+                zz_list += zz_tot
+
+                # Observed dimensions
+                x_obs_tot = r.T @ X_obs
+                x_list[:, id_obs] += x_obs_tot
+                xx_diag_list[:, id_obs] += (r.T @ X_obs**2 -
+                                            2*mu_obs*x_obs_tot +
+                                            r_sum[:, np.newaxis]*mu_obs**2)
+                xz_list[:, id_obs, :] += (
+                    X_obs.T @ rz -
+                    mu_obs[:, :, np.newaxis] * z_tot[:, np.newaxis, :]
                     )
-                mean_z_cond = W_obs.T @ Beta @ row_min_mu
-                cov_z_cond = np.eye(self.latent_dim) - W_obs.T @ Beta @ W_obs
-
-                # Simplify for case with no missing data
-                if n_miss == 0:
-                    x_tot += row_obs*r[n]
-                    z_tot += mean_z_cond*r[n]
-                    zz = cov_z_cond + np.outer(mean_z_cond, mean_z_cond)
-                    zz_tot += zz*r[n]
-                    xz = np.outer(row_min_mu, mean_z_cond)
-                    xz_tot += xz*r[n]
-                    zx = xz.T
-                    zx_tot += zx*r[n]
-                    xx = np.outer(row_min_mu, row_min_mu)
-                    xx_tot += xx*r[n]
-                    continue
 
-                # Get conditional distribution of p(x_miss | z, params)
-                mean_x_miss = W_miss.dot(mean_z_cond) + mu_miss
-
-                # Append sufficient statistics
-                z_tot += mean_z_cond*r[n]
-                zz = cov_z_cond + np.outer(mean_z_cond, mean_z_cond)
-                zz_tot += zz
-
-                x_tot[id_obs] += row_obs*r[n]
-                x_tot[id_miss] += mean_x_miss*r[n]
-
-                xz = np.zeros([self.data_dim, self.latent_dim])
-                xz[id_miss, :] = W_miss @ zz
-                xz[id_obs, :] = np.outer(row_min_mu, mean_z_cond)
-                xz_tot += xz*r[n]
-
-                zx = xz.T
-                zx_tot += zx*r[n]
-
-                xx = np.empty([data_dim, data_dim])
-                xx[np.ix_(id_obs, id_obs)] = np.outer(row_min_mu, row_min_mu)
-                xx[np.ix_(id_obs, id_miss)] = np.outer(row_min_mu,
-                                                       mean_x_miss - mu_miss)
-                xx[np.ix_(id_miss, id_obs)] = np.outer(mean_x_miss - mu_miss,
-                                                       row_min_mu)
-                xx[np.ix_(id_miss, id_miss)] = (
-                    W_miss @ zz @ W_miss.T + Psi_miss
+                # Missing dimensions, from p(x_miss | z, params)
+                W_miss_zz = W_miss @ zz_tot
+                x_list[:, id_miss] += (
+                    np.einsum('kml,kl->km', W_miss, z_tot) +
+                    r_sum[:, np.newaxis] * mu_miss
                     )
-                xx_tot += xx*r[n]
-            x_list.append(x_tot)
-            xx_list.append(xx_tot)
-            z_list.append(z_tot)
-            zz_list.append(zz_tot)
-            xz_list.append(xz_tot)
-            zx_list.append(zx_tot)
+                xx_diag_list[:, id_miss] += (
+                    np.sum(W_miss_zz * W_miss, axis=2) +
+                    r_sum[:, np.newaxis] * Psi_list[:, id_miss]
+                    )
+                xz_list[:, id_miss, :] += W_miss_zz
 
         # Store sufficient statistics in dictionary
         ss = {'r_list': r_list,
               'x_list': x_list,
-              'xx_list': xx_list,
+              'xx_diag_list': xx_diag_list,
               'xz_list': xz_list,
-              'zx_list': zx_list,
+              'zx_list': xz_list.transpose(0, 2, 1),
               'z_list': z_list,
               'zz_list': zz_list}
 
@@ -1501,10 +3706,9 @@ class MFA(GMM):
         params : dict
 
         """
-        n_examples = self.n_examples
         r_list = ss['r_list']
         x_list = ss['x_list']
-        xx_list = ss['xx_list']
+        xx_diag_list = ss['xx_diag_list']
         xz_list = ss['xz_list']
         zx_list = ss['zx_list']
         z_list = ss['z_list']
@@ -1512,34 +3716,26 @@ class MFA(GMM):
         W_list_old = params['W_list']
 
         # Update components param
-        components = np.array([r/n_examples for r in r_list])
-
-        # Update mean / Sigma params
-        mu_list = []
-        W_list = []
-        Psi_list = []
-        for r, W, x, xx, xz, zx, z, zz in zip(r_list, W_list_old, x_list,
-                                              xx_list, xz_list, zx_list,
-                                              z_list, zz_list):
-            # mu
-            resid = x - W @ z
-            mu = resid / r
-            mu_list.append(mu)
-
-            # W
-            try:
-                W = np.linalg.solve(zz, xz.T).T
-            except np.linalg.linalg.LinAlgError:
-                if self.robust:
-                    zz_cond = zz + self.SMALL*np.eye(self.latent_dim)
-                    W = np.linalg.solve(zz_cond, xz.T).T
-                else:
-                    raise np.linalg.linalg.LinAlgError(self.error_msg)
-            W_list.append(W)
-
-            # Psi
-            Psi = np.diag(np.diag(xx - W @ zx)) / r
-            Psi_list.append(Psi)
+        components = r_list / r_list.sum()
+
+        # mu
+        resid = x_list - np.einsum('kdl,kl->kd', W_list_old, z_list)
+        mu_list = resid / r_list[:, np.newaxis]
+
+        # W
+        try:
+            W_list = np.linalg.solve(zz_list, xz_list.transpose(0, 2, 1))
+        except np.linalg.LinAlgError:
+            if self.robust:
+                zz_cond = zz_list + self.SMALL*np.eye(self.latent_dim)
+                W_list = np.linalg.solve(zz_cond, xz_list.transpose(0, 2, 1))
+            else:
+                raise np.linalg.LinAlgError(self.error_msg)
+        W_list = W_list.transpose(0, 2, 1)
+
+        # Psi
+        Psi_list = ((xx_diag_list - np.einsum('kdl,kld->kd', W_list, zx_list))
+                    / r_list[:, np.newaxis])
 
         # Store params in dictionary
         params = {'W_list': W_list,
@@ -1571,26 +3767,49 @@ class MFA(GMM):
             print("Model is not yet fitted. First use fit to learn the " +
                   "model params.")
         else:
-            components = self.params['components']
-            mu_list = self.params['mu_list']
-            Sigma_list = self._params_to_Sigma(self.params, noisy=noisy)
-            components_cumsum = np.cumsum(components)
-            samples = np.zeros([n_samples, self.data_dim])
-            for n in range(n_samples):
-                r = np.random.rand(1)
-                z = np.argmin(r > components_cumsum)
-                samples[n] = rd.multivariate_normal(mu_list[z], Sigma_list[z])
-            return samples
+            return self._sample(self.params, n_samples, noisy)
+
+    def _get_sampling_factors(self, params, noisy=True):
+        """ Sample as z W^T + mu + noise, without forming W W^T + Psi"""
+        factors = {'mu_list': params['mu_list'], 'W_list': params['W_list']}
+        if noisy:
+            factors['std_list'] = np.sqrt(params['Psi_list'])
+        return factors
 
     def _params_to_Sigma(self, params, noisy=True):
         W_list = params['W_list']
         Psi_list = params['Psi_list']
+        Sigma_list = W_list @ W_list.transpose(0, 2, 1)
         if noisy:
-            Sigma_list = [W @ W.T + Psi for W, Psi in zip(W_list, Psi_list)]
-        else:
-            Sigma_list = [W @ W.T for W in W_list]
+            Sigma_list = (Sigma_list + Psi_list[:, :, np.newaxis] *
+                          np.eye(Psi_list.shape[1]))
         return Sigma_list
 
+    def _marginal_params(self, params, id_obs):
+        return {'mu_list': params['mu_list'][:, id_obs],
+                'W_list': params['W_list'][:, id_obs, :],
+                'Psi_list': params['Psi_list'][:, id_obs],
+                'components': params['components']}
+
+    def _n_parameters(self):
+        """ Number of free parameters, excluding rotations of W"""
+        W_params = (self.data_dim * self.latent_dim -
+                    self.latent_dim * (self.latent_dim - 1) // 2)
+        return (self.n_components * (2*self.data_dim + W_params) +
+                self.n_components - 1)
+
+    def _get_factors(self, params):
+        """ Factorize W W^T + diag(Psi) without forming it"""
+        return self._get_low_rank_factors(params['mu_list'], params['W_list'],
+                                          params['Psi_list'],
+                                          params['components'])
+
+    def _get_log_prob(self, X, factors):
+        return self._get_low_rank_log_prob(X, factors)
+
+    def _get_log_prob_observed(self, X, missing, params, factors):
+        return self._get_low_rank_log_prob_observed(X, missing, factors)
+
     def reconstruct(self, Z, component, noisy=False):
         """Sample from fitted model.
 
@@ -1619,8 +3838,6 @@ class MFA(GMM):
             Psi = self.params['Psi_list'][component]
             reconstructions = Z @ W.T + mu
             if noisy:
-                noise = np.random.multivariate_normal(
-                            np.zeros(self.data_dim), Psi, Z.shape[0]
-                        )
-                reconstructions = reconstructions + noise
+                noise = np.random.randn(Z.shape[0], self.data_dim)
+                reconstructions = reconstructions + noise*np.sqrt(Psi)
             return reconstructions
@@ -0,0 +1,240 @@
+"""Model selection for mixture models.
+
+Fits a grid of configurations, over the number of mixture components and,
+for MPPCA and MFA, the latent dimensionality, and scores each one with the
+Bayesian or Akaike information criterion or the log-likelihood of held-out
+data.
+
+Neighbouring configurations are warm-started from each other's parameters:
+latent_dim L + 1 starts from the L solution with an extra column in W, and
+n_components K + 1 starts from the K solution with its heaviest component
+split in two. The warm-started chains are spread across a process pool.
+"""
+
+# License: MIT
+
+import multiprocessing
+import os
+import numpy as np
+
+from sklearn.utils import check_random_state
+
+from .models import MPPCA, MFA, _SharedData, _init_worker, _worker
+
+
+def _split_component(model, params, rng):
+    """ Add a component by splitting the heaviest one in two.
+
+    The two halves share the component's weight, and their means are moved
+    apart along a random direction scaled by the component's standard
+    deviations.
+    """
+    k = np.argmax(params['components'])
+    params = {key: np.concatenate([value, value[k:k+1]]) for key, value in
+              params.items()}
+    params_k = {key: value[k:k+1] for key, value in params.items()}
+    std = np.sqrt(np.diagonal(model._params_to_Sigma(params_k)[0]))
+    offset = std * rng.randn(std.size) / np.sqrt(std.size)
+    params['mu_list'][k] += offset
+    params['mu_list'][-1] -= offset
+    params['components'][k] /= 2
+    params['components'][-1] /= 2
+    return params
+
+
+def _add_latent_dim(params, rng):
+    """ Add a latent dimension by appending a random column to W.
+
+    The column is scaled to the noise level, so EM can grow it into the
+    direction of largest residual variance.
+    """
+    params = dict(params)
+    W_list = params['W_list']
+    if 'Psi_list' in params:
+        noise_std = np.sqrt(params['Psi_list'])
+    else:
+        noise_std = np.sqrt(params['sigma_sq_list'])[:, np.newaxis]
+    column = noise_std * rng.randn(W_list.shape[0], W_list.shape[1])
+    params['W_list'] = np.concatenate([W_list, column[:, :, np.newaxis]],
+                                      axis=2)
+    return params
+
+
+def _fit_chain(model_class, chain, X, X_valid, criterion, model_params,
+               fit_params):
+    """ Fit a chain of configurations, warm-starting each from the last.
+
+    Returns a list of (n_components, latent_dim, model, value) tuples, where
+    value is the model's score under criterion.
+    """
+    results = []
+    model = None
+    for n_components, latent_dim in chain:
+        if latent_dim is None:
+            new_model = model_class(n_components, **model_params)
+        else:
+            new_model = model_class(n_components, latent_dim, **model_params)
+
+        if model is None:
+            new_model.fit(X, **fit_params)
+        else:
+            params = model.params
+            rng = check_random_state(new_model.random_state)
+            for _ in range(n_components - model.n_components):
+                params = _split_component(model, params, rng)
+            if latent_dim is not None:
+                for _ in range(latent_dim - model.latent_dim):
+                    params = _add_latent_dim(params, rng)
+            new_model.fit(X, params_init=params, **fit_params)
+        model = new_model
+
+        if criterion == 'bic':
+            value = model.bic()
+        elif criterion == 'aic':
+            value = model.aic()
+        else:
+            value = model.score(X_valid)
+        results.append((n_components, latent_dim, model, value))
+    return results
+
+
+def _init_selection_worker(source, X_valid):
+    """ Attach a worker process to the shared training data"""
+    _init_worker(None, source)
+    _worker['X_valid'] = X_valid
+
+
+def _fit_chain_worker(task):
+    """ Fit a chain of configurations on the shared training data"""
+    model_class, chain, criterion, model_params, fit_params = task
+    return _fit_chain(model_class, chain, _worker['X'], _worker['X_valid'],
+                      criterion, model_params, fit_params)
+
+
+def select_model(model_class, X, n_components_list, latent_dim_list=None,
+                 criterion='bic', X_valid=None, warm_start=True, n_jobs=None,
+                 model_params=None, fit_params=None):
+    """ Fit and score a grid of model configurations.
+
+    Parameters
+    ----------
+    model_class : class
+        One of GMM, SphericalGMM, DiagonalGMM, MPPCA or MFA.
+
+    X : array, [nExamples, nFeatures], np.memmap or str
+        Training data, as accepted by fit. With n_jobs > 1 it must be an
+        array, a memory-mapped array or the path to a .npy file.
+
+    n_components_list : list of int
+        Numbers of mixture components to try.
+
+    latent_dim_list : list of int
+        Latent dimensionalities to try. Required for MPPCA and MFA, and not
+        used by the other models.
+
+    criterion : str
+        'bic' or 'aic' (lower is better), computed from the training
+        log-likelihood, or 'likelihood' for the mean log-likelihood per
+        dimension of X_valid (higher is better).
+
+    X_valid : array, [nExamples, nFeatures]
+        Held-out data, required for criterion='likelihood'.
+
+    warm_start : bool
+        Whether to initialise configurations from their neighbours. For
+        MPPCA and MFA, each n_components is a chain over increasing
+        latent_dim. For the other models the n_components grid is split
+        into one chain per process. Otherwise every configuration starts
+        from a fresh initialisation.
+
+    n_jobs : int, optional
+        Number of processes over which the chains are spread. -1 uses all
+        CPUs.
+
+    model_params : dict, optional
+        Keyword arguments for the model constructor, e.g. tol or robust.
+        Models are not verbose unless verbose=True is given.
+
+    fit_params : dict, optional
+        Keyword arguments for fit, e.g. init_method, n_init or accelerate,
+        passed to every fit. Warm-started configurations are fitted with
+        params_init, so fit ignores init_method, init_size and n_init for
+        them.
+
+    Returns
+    -------
+    best_model : BaseModel
+        The fitted model with the best score.
+
+    results : list of dict
+        One entry for each configuration, ordered by n_components then
+        latent_dim, with keys 'n_components', 'latent_dim', 'model' and
+        criterion.
+    """
+    if criterion not in ('bic', 'aic', 'likelihood'):
+        raise ValueError("criterion must be 'bic', 'aic' or 'likelihood'")
+    if criterion == 'likelihood' and X_valid is None:
+        raise ValueError("criterion='likelihood' requires X_valid")
+    latent = issubclass(model_class, (MPPCA, MFA))
+    if latent and latent_dim_list is None:
+        raise ValueError('latent_dim_list is required for ' +
+                         model_class.__name__)
+    params = {'verbose': False}
+    params.update(model_params or {})
+    model_params = params
+    fit_params = fit_params or {}
+    if n_jobs is not None and n_jobs < 0:
+        n_jobs = os.cpu_count()
+    n_workers = 1 if n_jobs is None else n_jobs
+
+    # Group configurations into warm-started chains
+    n_components_list = sorted(set(n_components_list))
+    if latent:
+        latent_dim_list = sorted(set(latent_dim_list))
+        chains = [[(n_components, latent_dim) for latent_dim in
+                   latent_dim_list] for n_components in n_components_list]
+    else:
+        configs = [(n_components, None) for n_components in
+                   n_components_list]
+        n_chains = min(n_workers, len(configs))
+        bounds = np.linspace(0, len(configs), n_chains + 1).astype(int)
+        chains = [configs[start:stop] for start, stop in
+                  zip(bounds[:-1], bounds[1:])]
+    if not warm_start:
+        chains = [[config] for chain in chains for config in chain]
+
+    if n_workers == 1:
+        chain_results = [_fit_chain(model_class, chain, X, X_valid,
+                                    criterion, model_params, fit_params)
+                         for chain in chains]
+    else:
+        shared = _SharedData(X, model_params.get('dtype', np.float64))
+        pool = multiprocessing.Pool(min(n_workers, len(chains)),
+                                    initializer=_init_selection_worker,
+                                    initargs=(shared.source, X_valid))
+        try:
+            chain_results = pool.map(
+                _fit_chain_worker,
+                [(model_class, chain, criterion, model_params, fit_params)
+                 for chain in chains],
+                chunksize=1
+                )
+        finally:
+            pool.terminate()
+            pool.join()
+            shared.close()
+
+    results = [{'n_components': n_components,
+                'latent_dim': latent_dim,
+                'model': model,
+                criterion: value}
+               for chain in chain_results
+               for n_components, latent_dim, model, value in chain]
+    results.sort(key=lambda result: (result['n_components'],
+                                     result['latent_dim'] or 0))
+    values = [result[criterion] for result in results]
+    if criterion == 'likelihood':
+        best = int(np.argmax(values))
+    else:
+        best = int(np.argmin(values))
+    return results[best]['model'], results
@@ -0,0 +1,169 @@
+"""Micro-batching front-end for scoring from asyncio code.
+
+Scoring one row at a time spends almost all of its time on per-call
+overhead. BatchScorer collects the rows of concurrent requests for up to
+max_delay seconds, or until max_batch_size rows are waiting, scores them
+with one vectorized call of a compiled Scorer in a worker thread, and
+resolves each request's future with its own rows.
+"""
+
+# License: MIT
+
+import asyncio
+import concurrent.futures
+import numpy as np
+
+_METHODS = ('score_samples', 'predict_proba', 'predict')
+
+
+class BatchScorer(object):
+    """ Asyncio scorer that batches concurrent requests.
+
+    Parameters
+    ----------
+    model : BaseModel or Scorer
+        Fitted model, which is compiled, or a compiled Scorer.
+
+    max_batch_size : int
+        Number of rows at which a batch is scored without waiting further.
+
+    max_delay : float
+        Longest time in seconds that a row waits for a batch to fill. Small
+        values lower latency, large values raise throughput.
+
+    max_workers : int
+        Number of worker threads, and so of batches scored concurrently.
+
+    Examples
+    --------
+    >>> scorer = BatchScorer(model, max_batch_size=512, max_delay=2e-4)
+    >>> sample_ll = await scorer.score_samples(x)
+    >>> await scorer.close()
+    """
+    def __init__(self, model, max_batch_size=256, max_delay=2e-4,
+                 max_workers=1):
+        if hasattr(model, 'compile'):
+            model = model.compile()
+        self.scorer = model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self._pending = {method: [] for method in _METHODS}
+        self._pending_rows = {method: 0 for method in _METHODS}
+        self._timers = {method: None for method in _METHODS}
+        self._tasks = set()
+        self._n_requests = 0
+        self._n_batches = 0
+        self._n_rows = 0
+        self._max_pending_rows = 0
+
+    @property
+    def metrics(self):
+        """ Queue-depth and throughput counters.
+
+        Returns
+        -------
+        metrics : dict
+            metrics['pending_requests'] : Requests waiting for a batch.
+
+            metrics['pending_rows'] : Rows waiting for a batch.
+
+            metrics['max_pending_rows'] : Largest number of rows that have
+                                          waited at once.
+
+            metrics['in_flight_batches'] : Batches being scored.
+
+            metrics['n_requests'], metrics['n_batches'],
+            metrics['n_rows'] : Totals scored so far.
+
+            metrics['mean_batch_size'] : Mean rows per batch.
+        """
+        return {'pending_requests': sum(len(pending) for pending in
+                                        self._pending.values()),
+                'pending_rows': sum(self._pending_rows.values()),
+                'max_pending_rows': self._max_pending_rows,
+                'in_flight_batches': len(self._tasks),
+                'n_requests': self._n_requests,
+                'n_batches': self._n_batches,
+                'n_rows': self._n_rows,
+                'mean_batch_size': self._n_rows / max(self._n_batches, 1)}
+
+    async def score_samples(self, X):
+        """ Log-likelihood per feature of each row, as Scorer.score_samples.
+
+        X may be a single row or an array of rows.
+        """
+        return await self._submit('score_samples', X)
+
+    async def predict_proba(self, X):
+        """ Posterior component probabilities, as Scorer.predict_proba"""
+        return await self._submit('predict_proba', X)
+
+    async def predict(self, X):
+        """ Most probable components, as Scorer.predict"""
+        return await self._submit('predict', X)
+
+    def _submit(self, method, X):
+        X = np.asarray(X, dtype=self.scorer.dtype)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.ndim != 2 or X.shape[1] != self.scorer.data_dim:
+            raise ValueError('Expected examples with {:d} features'.format(
+                self.scorer.data_dim))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[method].append((X, future))
+        self._pending_rows[method] += X.shape[0]
+        self._max_pending_rows = max(self._max_pending_rows,
+                                     sum(self._pending_rows.values()))
+        if self._pending_rows[method] >= self.max_batch_size:
+            self._flush(method)
+        elif self._timers[method] is None:
+            self._timers[method] = loop.call_later(self.max_delay,
+                                                   self._flush, method)
+        return future
+
+    def _flush(self, method):
+        """ Start scoring the pending requests of method as one batch"""
+        if self._timers[method] is not None:
+            self._timers[method].cancel()
+            self._timers[method] = None
+        requests = [(X, future) for X, future in self._pending[method] if
+                    not future.cancelled()]
+        self._pending[method] = []
+        self._pending_rows[method] = 0
+        if not requests:
+            return
+        # The loop only keeps weak references to tasks
+        task = asyncio.ensure_future(self._score_batch(method, requests))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score_batch(self, method, requests):
+        loop = asyncio.get_running_loop()
+        try:
+            X = np.concatenate([X for X, _ in requests])
+            result = await loop.run_in_executor(
+                self._executor, getattr(self.scorer, method), X
+                )
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._n_requests += len(requests)
+        self._n_batches += 1
+        self._n_rows += X.shape[0]
+        start = 0
+        for X_request, future in requests:
+            stop = start + X_request.shape[0]
+            if not future.done():
+                future.set_result(result[start:stop])
+            start = stop
+
+    async def close(self):
+        """ Score any pending requests and shut down the worker threads"""
+        for method in _METHODS:
+            self._flush(method)
+        await asyncio.gather(*self._tasks)
+        self._executor.shutdown()
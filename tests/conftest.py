@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pyMM import GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA
+
+
+@pytest.fixture(params=[GMM, SphericalGMM, DiagonalGMM, MPPCA, MFA],
+                ids=lambda model_class: model_class.__name__)
+def model_class(request):
+    """ Each of the five model classes"""
+    return request.param
+
+
+@pytest.fixture
+def make_data():
+    """ Factory for data from three well-separated clusters"""
+    def make(n_examples=300, data_dim=4, missing=0., standardize=False,
+             seed=0):
+        rng = np.random.RandomState(seed)
+        X = np.concatenate([rng.randn(n_examples // 3, data_dim) + centre
+                            for centre in (0, 4, 8)])
+        if standardize:
+            X = (X - X.mean(axis=0)) / X.std(axis=0)
+        if missing:
+            X[rng.rand(*X.shape) < missing] = np.nan
+        return X
+    return make
+
+
+@pytest.fixture
+def make_model():
+    """ Factory for quiet models with three components, and a latent
+    dimensionality of 2 for MPPCA and MFA.
+    """
+    def make(model_class, n_components=3, **kwargs):
+        kwargs.setdefault('verbose', False)
+        if model_class in (MPPCA, MFA):
+            return model_class(n_components, 2, **kwargs)
+        return model_class(n_components, **kwargs)
+    return make
+
+
+@pytest.fixture
+def make_params_init(make_model):
+    """ Factory for shared starting parameters, taken after one EM
+    iteration so that the fits being compared start from the same point.
+    """
+    def make(model_class, X, **kwargs):
+        model = make_model(model_class, max_iter=1, **kwargs)
+        model.fit(X)
+        return {key: np.array(value) for key, value in model.params.items()}
+    return make
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from pyMM.callbacks import Callback
+
+
+class _LogLikelihoods(Callback):
+    """ Records the log-likelihood reported at every iteration"""
+
+    def on_fit_begin(self, model):
+        self.log_likelihoods = []
+
+    def on_iteration(self, model, info):
+        self.log_likelihoods.append(info['log_likelihood'])
+
+
+@pytest.mark.parametrize('missing', [0., 0.1])
+def test_squarem_is_monotone(model_class, make_model, make_params_init,
+                             missing):
+    # Overlapping, correlated clusters, on which EM converges slowly
+    rng = np.random.RandomState(0)
+    X = np.concatenate([0.3*rng.randn(300, 6).dot(rng.randn(6, 6)) + centre
+                        for centre in (0, 1, 2, 3)])
+    X[rng.rand(*X.shape) < missing] = np.nan
+    params_init = make_params_init(model_class, X, n_components=4)
+    lls = {}
+    for accelerate in (False, True):
+        trace = _LogLikelihoods()
+        model = make_model(model_class, n_components=4, max_iter=300,
+                           tol=1e-8)
+        model.fit(X, params_init=params_init, accelerate=accelerate,
+                  callbacks=[trace])
+        lls[accelerate] = np.array(trace.log_likelihoods)
+
+    assert np.all(np.diff(lls[True]) > -1e-10)
+    assert lls[True][-1] > lls[False][-1] - 1e-4
+    assert len(lls[True]) <= len(lls[False])
@@ -0,0 +1,42 @@
+import pytest
+
+from pyMM import GMM
+from pyMM.callbacks import Callback, ProgressPrinter
+
+
+class _Recorder(Callback):
+    """ Records log_prob_time and whether the model's log-densities were
+    wrapped with timers.
+    """
+
+    def __init__(self, uses_log_prob_time):
+        self.uses_log_prob_time = uses_log_prob_time
+        self.log_prob_times = []
+        self.wrapped = []
+
+    def on_iteration(self, model, info):
+        self.log_prob_times.append(info['log_prob_time'])
+        self.wrapped.append('_get_log_prob' in vars(model))
+
+
+@pytest.mark.parametrize('uses_log_prob_time', [False, True])
+def test_profiling_only_when_used(make_data, make_model,
+                                  uses_log_prob_time):
+    recorder = _Recorder(uses_log_prob_time)
+    model = make_model(GMM, max_iter=5, tol=0)
+    model.fit(make_data(), callbacks=[ProgressPrinter(), recorder])
+    assert all(wrapped == uses_log_prob_time
+               for wrapped in recorder.wrapped)
+    if uses_log_prob_time:
+        assert all(t >= 0 for t in recorder.log_prob_times)
+    else:
+        assert all(t is None for t in recorder.log_prob_times)
+    assert '_get_log_prob' not in vars(model)
+
+
+def test_verbose_fit_is_not_profiled(make_data, make_model, capsys):
+    recorder = _Recorder(False)
+    model = make_model(GMM, max_iter=5, tol=0, verbose=True)
+    model.fit(make_data(), callbacks=[recorder])
+    assert not any(recorder.wrapped)
+    assert 'Iter 4' in capsys.readouterr().out
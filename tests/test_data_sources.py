@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from pyMM import GMM
+
+
+@pytest.mark.parametrize('init_size', [None, 100])
+@pytest.mark.parametrize('source', ['memmap', 'path', 'chunks'])
+def test_out_of_core_fit_matches_in_memory(model_class, make_data,
+                                           make_model, tmpdir, source,
+                                           init_size):
+    X = make_data()
+    model = make_model(model_class, max_iter=20, random_state=0)
+    model.fit(X, init_size=init_size)
+
+    path = str(tmpdir.join('X.npy'))
+    np.save(path, X)
+    if source == 'memmap':
+        X_source = np.load(path, mmap_mode='r')
+    elif source == 'path':
+        X_source = path
+    else:
+        X_source = np.array_split(X, 7)
+    # A working memory of a few rows reads the data in many chunks
+    model_source = make_model(model_class, max_iter=20, random_state=0,
+                              working_memory=2e-3)
+    model_source.fit(X_source, init_size=init_size)
+
+    assert model_source.trainNll == pytest.approx(model.trainNll)
+    for key in model.params:
+        np.testing.assert_allclose(model_source.params[key],
+                                   model.params[key], rtol=1e-6,
+                                   atol=1e-8)
+
+
+def test_default_init_size_is_shared(make_data, make_model, tmpdir):
+    # Over 100000 examples, so the default init_size subsamples the data
+    X = make_data(n_examples=100005, data_dim=2)
+    path = str(tmpdir.join('X.npy'))
+    np.save(path, X)
+    models = []
+    for X_source in (X, np.load(path, mmap_mode='r')):
+        model = make_model(GMM, max_iter=2, random_state=0)
+        model.fit(X_source)
+        models.append(model)
+    for key in models[0].params:
+        np.testing.assert_array_equal(models[1].params[key],
+                                      models[0].params[key])
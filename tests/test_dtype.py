@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+# Tolerance on the mean log-likelihood per dimension stated for dtype
+TOL = 1e-4
+
+
+@pytest.mark.parametrize('missing', [0., 0.1])
+def test_float32_matches_float64(model_class, make_data, make_model,
+                                 make_params_init, missing):
+    X = make_data(n_examples=600, data_dim=5, missing=missing,
+                  standardize=True)
+    params_init = make_params_init(model_class, X)
+
+    model64 = make_model(model_class, max_iter=20, dtype=np.float64)
+    model64.fit(X, params_init=params_init)
+    model32 = make_model(model_class, max_iter=20, dtype=np.float32)
+    model32.fit(X.astype(np.float32), params_init=params_init)
+
+    assert abs(model32.trainNll - model64.trainNll) < TOL
+    assert abs(model32.score(X) - model64.score(X)) < TOL
+    assert model32.score_samples(X).dtype == np.float32
+    scorer = model32.compile()
+    assert scorer.score_samples(X).dtype == np.float32
+    assert scorer.predict_proba(X).dtype == np.float32
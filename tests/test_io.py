@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from pyMM.io import save_model, load_model
+
+
+@pytest.mark.parametrize('random_state', [3, np.int64(3), None])
+def test_random_state_is_saved(make_data, make_model, model_class, tmpdir,
+                               random_state):
+    X = make_data()
+    model = make_model(model_class, max_iter=5, random_state=random_state)
+    model.fit(X)
+    save_model(model, str(tmpdir))
+    loaded = load_model(str(tmpdir))
+    assert loaded.random_state == random_state
+    np.testing.assert_allclose(loaded.score_samples(X),
+                               model.score_samples(X))
@@ -0,0 +1,42 @@
+import numpy as np
+
+from pyMM import GMM
+from pyMM.callbacks import Callback
+
+
+class _RunLengths(Callback):
+    """ Records the number of iterations reported for each EM run"""
+
+    def __init__(self):
+        self.runs = []
+
+    def on_iteration(self, model, info):
+        if info['iteration'] == 0:
+            self.runs.append(0)
+        self.runs[-1] += 1
+
+
+def _fit_restarts(make_model, X, prune_tol):
+    run_lengths = _RunLengths()
+    model = make_model(GMM, n_components=6, max_iter=200, tol=1e-8,
+                       random_state=0)
+    model.fit(X, n_init=6, prune_tol=prune_tol, callbacks=[run_lengths])
+    return model, run_lengths.runs
+
+
+def test_pruning_abandons_trailing_runs(make_model):
+    # Eight overlapping clusters, so that restarts reach different optima
+    rng = np.random.RandomState(0)
+    X = np.concatenate([0.6*rng.randn(60, 2) + centre
+                        for centre in 8*rng.rand(8, 2)])
+    model, runs = _fit_restarts(make_model, X, prune_tol=None)
+    model_pruned, runs_pruned = _fit_restarts(make_model, X, prune_tol=0.)
+
+    assert runs == [200] * 6
+    # The first run leads throughout and is never abandoned
+    assert runs_pruned[0] == 200
+    assert sum(runs_pruned) < sum(runs) / 2
+    assert model_pruned.trainNll == model.trainNll
+    for key in model.params:
+        np.testing.assert_array_equal(model_pruned.params[key],
+                                      model.params[key])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('missing', [0., 0.1])
+def test_sharded_fit_matches_serial(model_class, make_data, make_model,
+                                    make_params_init, missing):
+    X = make_data(missing=missing)
+    params_init = make_params_init(model_class, make_data())
+
+    model = make_model(model_class, max_iter=20, tol=0)
+    model.fit(X, params_init=params_init)
+    model_sharded = make_model(model_class, max_iter=20, tol=0)
+    model_sharded.fit(X, params_init=params_init, n_jobs=2)
+
+    assert model_sharded.trainNll == pytest.approx(model.trainNll,
+                                                   rel=1e-10)
+    for key in model.params:
+        np.testing.assert_allclose(model_sharded.params[key],
+                                   model.params[key], rtol=1e-8,
+                                   atol=1e-10)
+
+
+def test_concurrent_restarts_match_serial(model_class, make_data,
+                                          make_model):
+    X = make_data()
+    model = make_model(model_class, max_iter=20, random_state=0)
+    model.fit(X, n_init=3)
+    model_parallel = make_model(model_class, max_iter=20, random_state=0)
+    model_parallel.fit(X, n_init=3, n_jobs=2)
+
+    assert model_parallel.trainNll == pytest.approx(model.trainNll,
+                                                    rel=1e-10)
+    for key in model.params:
+        np.testing.assert_allclose(model_parallel.params[key],
+                                   model.params[key], rtol=1e-8,
+                                   atol=1e-10)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from pyMM import GMM
+from pyMM.io import save_model, load_model
+
+
+def test_partial_fit_after_fit_keeps_score(model_class, make_data,
+                                           make_model):
+    X = make_data()
+    model = make_model(model_class, max_iter=50)
+    model.fit(X)
+    score = model.score(X)
+    model.partial_fit(X[:5])
+    assert model.n_examples == X.shape[0] + 5
+    assert abs(model.score(X) - score) < 1e-2
+
+
+def test_partial_fit_after_load_matches(tmpdir, make_data, make_model):
+    X = make_data()
+    model = make_model(GMM, max_iter=50)
+    model.fit(X)
+    save_model(model, str(tmpdir))
+    loaded = load_model(str(tmpdir))
+    for batch in (X[:5], X[100:110]):
+        model.partial_fit(batch)
+        loaded.partial_fit(batch)
+    for key in model.params:
+        np.testing.assert_allclose(loaded.params[key], model.params[key])
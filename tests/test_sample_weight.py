@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('missing', [0., 0.1])
+def test_integer_weights_match_repeated_rows(model_class, make_data,
+                                             make_model, make_params_init,
+                                             missing):
+    X = make_data(missing=missing)
+    rng = np.random.RandomState(1)
+    weights = rng.randint(0, 4, size=X.shape[0])
+    X_repeated = np.repeat(X, weights, axis=0)
+    params_init = make_params_init(model_class, make_data())
+
+    model = make_model(model_class, max_iter=30, tol=0)
+    model.fit(X, params_init=params_init, sample_weight=weights)
+    model_repeated = make_model(model_class, max_iter=30, tol=0)
+    model_repeated.fit(X_repeated, params_init=params_init)
+
+    assert model.n_examples == model_repeated.n_examples
+    assert model.trainNll == pytest.approx(model_repeated.trainNll,
+                                           rel=1e-10)
+    for key in model.params:
+        np.testing.assert_allclose(model.params[key],
+                                   model_repeated.params[key],
+                                   rtol=1e-8, atol=1e-10)
+    assert model.score(X, weights) == pytest.approx(
+        model_repeated.score(X_repeated), rel=1e-10)
+    assert model.bic(X, weights) == pytest.approx(
+        model_repeated.bic(X_repeated), rel=1e-10)
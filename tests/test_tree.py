@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from pyMM import GMM
+
+
+def _fit_pair(model_class, X, make_model, make_params_init, tree_tol):
+    """ Fit from the same start with the dense and the kd-tree E-step"""
+    params_init = make_params_init(model_class, X)
+    model = make_model(model_class, max_iter=30, tol=0)
+    model.fit(X, params_init=params_init)
+    model_tree = make_model(model_class, max_iter=30, tol=0)
+    model_tree.fit(X, params_init=params_init, tree_tol=tree_tol)
+    return model, model_tree
+
+
+def test_zero_tolerance_matches_dense(model_class, make_data, make_model,
+                                      make_params_init):
+    X = make_data(n_examples=3000, data_dim=3)
+    model, model_tree = _fit_pair(model_class, X, make_model,
+                                  make_params_init, tree_tol=0.)
+    assert model_tree.trainNll == pytest.approx(model.trainNll, rel=1e-10)
+    for key in model.params:
+        np.testing.assert_allclose(model_tree.params[key],
+                                   model.params[key], rtol=1e-8,
+                                   atol=1e-10)
+
+
+def test_tolerance_gives_lower_bound(model_class, make_data, make_model,
+                                     make_params_init):
+    X = make_data(n_examples=3000, data_dim=3)
+    model, model_tree = _fit_pair(model_class, X, make_model,
+                                  make_params_init, tree_tol=0.01)
+    assert model_tree.trainNll <= model_tree.score(X)
+    assert model_tree.trainNll == pytest.approx(model.trainNll, abs=1e-3)
+
+
+def test_invalid_combinations_are_rejected(make_data, make_model):
+    with pytest.raises(ValueError):
+        make_model(GMM).fit(make_data(missing=0.1), tree_tol=0.01)
+    with pytest.raises(ValueError):
+        make_model(GMM).fit(make_data(), tree_tol=0.01, n_candidates=1)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from pyMM import GMM
+
+
+def _fit_pair(model_class, X, make_model, make_params_init, **kwargs):
+    """ Fit from the same start with the dense and the truncated E-step"""
+    params_init = make_params_init(model_class, X)
+    model = make_model(model_class, max_iter=30, tol=0)
+    model.fit(X, params_init=params_init)
+    model_truncated = make_model(model_class, max_iter=30, tol=0)
+    model_truncated.fit(X, params_init=params_init, **kwargs)
+    return model, model_truncated
+
+
+def test_all_but_one_candidate_matches_dense(model_class, make_data,
+                                             make_model, make_params_init):
+    # Each example has negligible responsibility from its farthest cluster
+    X = make_data()
+    model, model_truncated = _fit_pair(model_class, X, make_model,
+                                       make_params_init, n_candidates=2)
+    assert model_truncated.trainNll == pytest.approx(model.trainNll,
+                                                     rel=1e-10)
+    for key in model.params:
+        np.testing.assert_allclose(model_truncated.params[key],
+                                   model.params[key], rtol=1e-8,
+                                   atol=1e-10)
+
+
+def test_single_candidate_is_lower_bound(model_class, make_data, make_model,
+                                         make_params_init):
+    X = make_data()
+    model, model_truncated = _fit_pair(model_class, X, make_model,
+                                       make_params_init, n_candidates=1)
+    assert model_truncated.trainNll <= model_truncated.score(X)
+    assert model_truncated.trainNll == pytest.approx(model.trainNll,
+                                                     abs=1e-4)
+
+
+def test_missing_data_is_rejected(make_data, make_model):
+    X = make_data(missing=0.1)
+    with pytest.raises(ValueError):
+        make_model(GMM).fit(X, n_candidates=1)